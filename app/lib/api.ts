@@ -469,6 +469,7 @@ export interface ActivityResponse {
 export interface ActivityFeedResponse {
   activities: ActivityResponse[];
   total: number;
+  next_cursor: string | null;
 }
 
 /**
@@ -476,9 +477,11 @@ export interface ActivityFeedResponse {
  */
 export async function getActivityFeed(
   limit: number = 50,
-  offset: number = 0
+  offset: number = 0,
+  cursor?: string | null
 ): Promise<ActivityFeedResponse> {
-  return makeRequest(`/activities/?limit=${limit}&offset=${offset}`);
+  const page = cursor ? `cursor=${encodeURIComponent(cursor)}` : `offset=${offset}`;
+  return makeRequest(`/activities/?limit=${limit}&${page}`);
 }
 
 /**
@@ -487,9 +490,11 @@ export async function getActivityFeed(
 export async function getUserActivities(
   userId: number,
   limit: number = 50,
-  offset: number = 0
+  offset: number = 0,
+  cursor?: string | null
 ): Promise<ActivityFeedResponse> {
-  return makeRequest(`/activities/user/${userId}?limit=${limit}&offset=${offset}`);
+  const page = cursor ? `cursor=${encodeURIComponent(cursor)}` : `offset=${offset}`;
+  return makeRequest(`/activities/user/${userId}?limit=${limit}&${page}`);
 }
 
 /**
@@ -543,13 +548,21 @@ export interface NotificationResponse {
 export interface NotificationsResponse {
   notifications: NotificationResponse[];
   unread_count: number;
+  next_cursor: string | null;
 }
 
 /**
- * Get user notifications
+ * Get user notifications (pass next_cursor to load the next page)
  */
-export async function getNotifications(): Promise<NotificationsResponse> {
-  return makeRequest('/notifications/');
+export async function getNotifications(
+  limit: number = 50,
+  cursor?: string | null,
+  isRead?: boolean
+): Promise<NotificationsResponse> {
+  let query = `limit=${limit}`;
+  if (cursor) query += `&cursor=${encodeURIComponent(cursor)}`;
+  if (isRead !== undefined) query += `&is_read=${isRead}`;
+  return makeRequest(`/notifications/?${query}`);
 }
 
 /**
@@ -570,6 +583,43 @@ export async function deleteNotification(notificationId: number): Promise<any> {
   });
 }
 
+export interface BulkNotificationSelector {
+  ids?: number[];
+  before?: string;
+  notification_type?: string;
+  all?: boolean;
+}
+
+export interface BulkNotificationResponse {
+  success: boolean;
+  affected: number;
+  unread_count: number;
+}
+
+/**
+ * Mark many notifications as read (e.g. { all: true } for "mark all as read")
+ */
+export async function markNotificationsAsRead(
+  selector: BulkNotificationSelector
+): Promise<BulkNotificationResponse> {
+  return makeRequest('/notifications/read', {
+    method: 'PUT',
+    body: JSON.stringify(selector),
+  });
+}
+
+/**
+ * Delete many notifications
+ */
+export async function deleteNotifications(
+  selector: BulkNotificationSelector
+): Promise<BulkNotificationResponse> {
+  return makeRequest('/notifications/delete', {
+    method: 'POST',
+    body: JSON.stringify(selector),
+  });
+}
+
 /**
  * Export all API functions for convenience
  */
@@ -609,4 +659,6 @@ export const API = {
   getNotifications,
   markNotificationAsRead,
   deleteNotification,
+  markNotificationsAsRead,
+  deleteNotifications,
 };
@@ -126,6 +126,7 @@ export interface Activity {
 export interface ActivityFeed {
   activities: Activity[];
   total: number;
+  next_cursor: string | null;
 }
 
 /**
@@ -154,6 +155,7 @@ export interface Notification {
 export interface NotificationsData {
   notifications: Notification[];
   unread_count: number;
+  next_cursor: string | null;
 }
 
 /**
@@ -164,6 +166,7 @@ export type WebSocketEventType =
   | 'waitlist_update'
   | 'activity_logged'
   | 'notification_received'
+  | 'unread_count'
   | 'fault_reported'
   | 'connected'
   | 'disconnected'
@@ -4,6 +4,9 @@
  * 
  * Features:
  * - Auto-reconnect with exponential backoff
+ * - Answers server heartbeat pings so the connection is not reaped
+ * - Resumes from the last seen sequence number after a reconnect
+ * - Unpacks batched frames into individual events
  * - Event type handling (machine_update, waitlist_update, etc.)
  * - Connection state tracking
  * - Message queuing during disconnection
@@ -13,14 +16,21 @@
 'use client';
 
 import { useEffect, useRef, useCallback, useState } from 'react';
-import { getStoredUser, WS_URL } from './api';
+import { getAccessToken, refreshAccessToken, WS_URL } from './api';
+
+// Close code for an invalid or expired access token (refresh and reconnect)
+const WS_CLOSE_AUTH_FAILED = 4001;
 
 export type WebSocketEventType =
   | 'machine_update'
   | 'waitlist_update'
   | 'activity_logged'
   | 'notification_received'
+  | 'unread_count'
   | 'fault_reported'
+  | 'snapshot'
+  | 'resumed'
+  | 'resync_required'
   | 'connected'
   | 'disconnected'
   | 'error';
@@ -29,6 +39,8 @@ export interface WebSocketMessage {
   event: WebSocketEventType;
   data: any;
   timestamp: string;
+  seq?: number;
+  epoch?: string;
 }
 
 export interface WebSocketState {
@@ -54,6 +66,9 @@ export function useWebSocket(
   const reconnectTimeoutRef = useRef<NodeJS.Timeout | null>(null);
   const reconnectCountRef = useRef(0);
   const messageQueueRef = useRef<any[]>([]);
+  const lastSeqRef = useRef<number | null>(null);
+  const epochRef = useRef<string | null>(null);
+  const authRefreshedRef = useRef(false);
   const [state, setState] = useState<WebSocketState>({
     isConnected: false,
     isReconnecting: false,
@@ -178,12 +193,17 @@ export function useWebSocket(
           isReconnecting: false,
         }));
 
-        // Send user_id to authenticate
-        const user = getStoredUser();
-        if (user?.id) {
-          sendMessage({ user_id: user.id });
-          log('Sent user authentication', { user_id: user.id });
+        // First frame authenticates (if logged in) and asks for missed events
+        // if we have seen any; it is always sent so the server need not wait
+        const token = getAccessToken();
+        const hello: any = token ? { token } : {};
+        if (lastSeqRef.current !== null) {
+          hello.action = 'resume';
+          hello.last_seq = lastSeqRef.current;
+          hello.epoch = epochRef.current;
         }
+        wsRef.current?.send(JSON.stringify(hello));
+        log('Sent hello', { authenticated: !!token, last_seq: lastSeqRef.current });
 
         // Flush queued messages
         flushMessageQueue();
@@ -198,8 +218,22 @@ export function useWebSocket(
 
       wsRef.current.onmessage = (event) => {
         try {
-          const message = JSON.parse(event.data) as WebSocketMessage;
+          const message = JSON.parse(event.data);
+          authRefreshedRef.current = false;
+          if (message.event === 'ping') {
+            wsRef.current?.send(JSON.stringify({ action: 'pong' }));
+            return;
+          }
+          // Events, and resumed/resync_required replies, carry the stream position
+          if (typeof message.seq === 'number') {
+            lastSeqRef.current = message.seq;
+            epochRef.current = message.epoch;
+          }
           log('Message received', message);
+          if (message.event === 'batch') {
+            message.events.forEach((batched: WebSocketMessage) => onMessage(batched));
+            return;
+          }
           onMessage(message);
         } catch (error) {
           log('Failed to parse WebSocket message', event.data);
@@ -215,8 +249,8 @@ export function useWebSocket(
         });
       };
 
-      wsRef.current.onclose = () => {
-        log('WebSocket disconnected');
+      wsRef.current.onclose = (event) => {
+        log('WebSocket disconnected', { code: event.code });
         wsRef.current = null;
 
         setState((prev) => ({
@@ -231,6 +265,25 @@ export function useWebSocket(
           timestamp: new Date().toISOString(),
         });
 
+        // 4001: access token rejected; refresh it once, then reconnect (anonymously if that fails)
+        if (event.code === WS_CLOSE_AUTH_FAILED) {
+          if (authRefreshedRef.current) {
+            log('Token rejected again after refresh, not reconnecting');
+            return;
+          }
+          authRefreshedRef.current = true;
+          refreshAccessToken()
+            .catch(() => log('Token refresh failed, reconnecting without authentication'))
+            .finally(() => connect());
+          return;
+        }
+
+        // 1008: refused by policy (e.g. too many connections for this user)
+        if (event.code === 1008) {
+          log('Connection refused by server policy, not reconnecting');
+          return;
+        }
+
         // Attempt to reconnect
         reconnect();
       };
@@ -309,6 +362,13 @@ export function useNotificationUpdates(callback: (notification: any) => void) {
   return useWebSocketEvent('notification_received', callback);
 }
 
+/**
+ * Custom hook to keep the unread notification badge current
+ */
+export function useUnreadCount(callback: (data: { unread_count: number }) => void) {
+  return useWebSocketEvent('unread_count', callback);
+}
+
 /**
  * Custom hook to handle fault reports
  */
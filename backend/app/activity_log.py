@@ -0,0 +1,167 @@
+"""
+Write-Behind Activity Log
+
+Activity rows are an audit trail, not part of the user-facing change, so most
+of them are kept out of the request's transaction. Routes record an entry
+inside their unit of work and publish it once the change has committed:
+
+- audit-critical types (ACTIVITY_SYNC_TYPES) are written in the same
+  transaction as the change, exactly as before
+- every other type is buffered in memory and bulk-inserted by a background
+  flusher every ACTIVITY_FLUSH_INTERVAL_MS or ACTIVITY_FLUSH_BATCH entries,
+  whichever comes first, and on shutdown
+
+Publishing also pushes the ``activity_logged`` WebSocket event, so the live
+feed and the table are fed from the same place. Buffered entries are lost if
+the process dies before the next flush.
+"""
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timezone
+from typing import List, Optional
+import asyncio
+import logging
+
+from app.models import Activity, ActivityType
+from app.websocket_manager import manager
+from app.write_queue import run_unit_of_work
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class ActivityLogger:
+    """Buffers activity entries and bulk-inserts them in the background"""
+
+    def __init__(self):
+        self._buffer: List[dict] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        # Metrics
+        self.sync_logged = 0
+        self.buffered = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+
+    def is_sync(self, activity_type) -> bool:
+        """Whether this type is written in the caller's transaction"""
+        return ActivityType(activity_type).value in settings.ACTIVITY_SYNC_TYPES
+
+    def record(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        activity_type: ActivityType,
+        machine_type=None,
+        machine_id: Optional[int] = None,
+        details: Optional[str] = None
+    ) -> dict:
+        """Inside a unit of work: build an entry, adding audit-critical types to the session"""
+        entry = {
+            "user_id": user_id,
+            "activity_type": ActivityType(activity_type),
+            "machine_type": machine_type,
+            "machine_id": machine_id,
+            "details": details,
+            "created_at": datetime.now(timezone.utc),
+        }
+        if self.is_sync(activity_type):
+            db.add(Activity(**entry))
+        return entry
+
+    async def publish(self, entry: dict):
+        """After commit: queue write-behind entries and push activity_logged"""
+        if self.is_sync(entry["activity_type"]):
+            self.sync_logged += 1
+        elif self._task is None:
+            # Flusher not running (scripts, startup): write straight away
+            try:
+                await self._insert([entry])
+            except Exception as e:
+                self.failed_flushes += 1
+                logger.error(f"Failed to log activity: {e}")
+        else:
+            self._enqueue(entry)
+
+        await manager.broadcast_activity({
+            "user_id": entry["user_id"],
+            "activity_type": entry["activity_type"],
+            "machine_type": entry["machine_type"],
+            "machine_id": entry["machine_id"],
+            "details": entry["details"],
+            "created_at": entry["created_at"].isoformat(),
+        })
+
+    def _enqueue(self, entry: dict):
+        if len(self._buffer) >= settings.ACTIVITY_QUEUE_MAX:
+            # Flushes keep failing; shed the oldest entries rather than grow forever
+            self._buffer.pop(0)
+            self.dropped += 1
+        self._buffer.append(entry)
+        self.buffered += 1
+        if len(self._buffer) >= settings.ACTIVITY_FLUSH_BATCH:
+            self._wakeup.set()
+
+    async def start(self):
+        """Start the background flusher"""
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write whatever is still buffered"""
+        if self._task is not None:
+            # Let an in-flight flush finish instead of cancelling it mid-insert
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        interval = settings.ACTIVITY_FLUSH_INTERVAL_MS / 1000
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Bulk-insert buffered entries, keeping them for a retry on failure"""
+        while self._buffer:
+            rows = self._buffer[:settings.ACTIVITY_FLUSH_BATCH]
+            del self._buffer[:len(rows)]
+            try:
+                await self._insert(rows)
+            except Exception as e:
+                self.failed_flushes += 1
+                logger.error(f"Failed to flush {len(rows)} activities: {e}")
+                self._buffer[:0] = rows
+                return
+
+    async def _insert(self, rows: List[dict]):
+        async def insert_rows(db: AsyncSession):
+            await db.execute(insert(Activity), rows)
+
+        await run_unit_of_work(insert_rows)
+        self.flushes += 1
+        self.flushed += len(rows)
+
+    def get_metrics(self) -> dict:
+        return {
+            "pending": len(self._buffer),
+            "sync_logged": self.sync_logged,
+            "buffered": self.buffered,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped,
+        }
+
+# Global activity logger instance
+activity_log = ActivityLogger()
@@ -0,0 +1,304 @@
+"""
+Activity Archive
+
+Moves activities older than ACTIVITY_ARCHIVE_AFTER_DAYS out of the hot
+``activities`` table into gzip-compressed NDJSON files, one per UTC day:
+
+    <ACTIVITY_ARCHIVE_DIR>/activities/2025/03/2025-03-14.ndjson.gz
+
+A manifest next to the files records the rows per day and per user, so
+per-user history reads open only the days that user has entries for, and the
+last archived (created_at, id). Rows up to that mark are never written twice,
+so a run interrupted between writing a file and deleting the rows is safe to
+repeat.
+
+The archiver runs in the server when ACTIVITY_ARCHIVE_ENABLED is set (enable
+it on one worker only), or once from cron:
+
+    python -m app.archive
+"""
+from sqlalchemy import select, delete
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import gzip
+import itertools
+import json
+import logging
+import os
+
+from app.database import ReadSessionLocal
+from app.models import Activity, ActivityType
+from app.write_queue import run_unit_of_work
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_BATCH = 5000  # rows moved per write/delete round
+ARCHIVE_READ_BATCH = 500  # records decoded per thread hop when streaming a day
+
+def naive_utc(value: datetime) -> datetime:
+    """Archive timestamps are naive UTC, like SQLite's CURRENT_TIMESTAMP"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def sort_key(record: dict) -> Tuple[datetime, int]:
+    return datetime.fromisoformat(record["created_at"]), record["id"]
+
+def activity_record(activity: Activity) -> dict:
+    """Plain, JSON-ready form of an activity as stored in the archive"""
+    return {
+        "id": activity.id,
+        "user_id": activity.user_id,
+        "activity_type": ActivityType(activity.activity_type).value,
+        "machine_type": getattr(activity.machine_type, "value", activity.machine_type),
+        "machine_id": activity.machine_id,
+        "details": activity.details,
+        "created_at": naive_utc(activity.created_at).isoformat(),
+    }
+
+class ActivityArchive:
+    """Archives old activities to daily gzip NDJSON files and reads them back"""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.path.join(settings.ACTIVITY_ARCHIVE_DIR, "activities")
+        self._manifest: Optional[dict] = None
+        self._manifest_mtime: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+        # Metrics
+        self.runs = 0
+        self.archived = 0
+        self.last_run: Optional[datetime] = None
+
+    # ============ Manifest ============
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.root, "manifest.json")
+
+    def _load_manifest(self) -> dict:
+        # Re-read when another process (the cron job) has rewritten it
+        try:
+            mtime = os.path.getmtime(self.manifest_path)
+        except FileNotFoundError:
+            return {"days": {}, "last": None}
+        if mtime != self._manifest_mtime:
+            with open(self.manifest_path) as f:
+                self._manifest = json.load(f)
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    def _save_manifest(self, manifest: dict):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+        self._manifest = manifest
+        self._manifest_mtime = os.path.getmtime(self.manifest_path)
+
+    def day_path(self, day: str) -> str:
+        """File holding one UTC day (YYYY-MM-DD)"""
+        return os.path.join(self.root, day[:4], day[5:7], f"{day}.ndjson.gz")
+
+    # ============ Archiving ============
+
+    def _write(self, records: List[dict]):
+        """Append records to their day files, then advance the manifest"""
+        manifest = json.loads(json.dumps(self._load_manifest()))
+        by_day: Dict[str, List[dict]] = defaultdict(list)
+        for record in records:
+            by_day[record["created_at"][:10]].append(record)
+
+        for day, rows in by_day.items():
+            path = self.day_path(day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Each append is a new gzip member; readers see one continuous stream
+            with open(path, "ab") as raw:
+                with gzip.GzipFile(fileobj=raw, mode="ab") as gz:
+                    gz.write("".join(json.dumps(row) + "\n" for row in rows).encode())
+                raw.flush()
+                os.fsync(raw.fileno())
+
+            info = manifest["days"].setdefault(day, {"rows": 0, "users": {}})
+            info["rows"] += len(rows)
+            for row in rows:
+                user_key = str(row["user_id"])
+                info["users"][user_key] = info["users"].get(user_key, 0) + 1
+
+        manifest["last"] = [records[-1]["created_at"], records[-1]["id"]]
+        self._save_manifest(manifest)
+
+    async def run_once(self) -> int:
+        """Move every activity older than the cutoff into the archive"""
+        # Archive whole days only, so a day's file is complete once written
+        cutoff = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(
+            days=settings.ACTIVITY_ARCHIVE_AFTER_DAYS
+        )
+        moved = 0
+        while not self._stopping:
+            async with ReadSessionLocal() as db:
+                result = await db.execute(
+                    select(Activity)
+                    .where(Activity.created_at < cutoff)
+                    .order_by(Activity.created_at, Activity.id)
+                    .limit(ARCHIVE_BATCH)
+                )
+                activities = result.scalars().all()
+            if not activities:
+                break
+
+            # Skip rows an interrupted run already wrote but did not delete
+            last = self._load_manifest()["last"]
+            high_water = (datetime.fromisoformat(last[0]), last[1]) if last else None
+            records = [activity_record(activity) for activity in activities]
+            fresh = [record for record in records if high_water is None or sort_key(record) > high_water]
+            if fresh:
+                await asyncio.to_thread(self._write, fresh)
+
+            ids = [activity.id for activity in activities]
+
+            async def delete_archived(db):
+                await db.execute(delete(Activity).where(Activity.id.in_(ids)))
+
+            await run_unit_of_work(delete_archived)
+            moved += len(fresh)
+
+        self.runs += 1
+        self.archived += moved
+        self.last_run = datetime.utcnow()
+        return moved
+
+    # ============ Reading ============
+
+    def archived_days(self, user_id: Optional[int] = None) -> List[str]:
+        """Archived days (oldest first), optionally only those with a user's rows"""
+        days = self._load_manifest()["days"]
+        if user_id is not None:
+            return sorted(day for day, info in days.items() if str(user_id) in info["users"])
+        return sorted(days)
+
+    def iter_day(self, day: str) -> Iterator[dict]:
+        """Stream one day's archived activities in archive order ((created_at, id) ascending)"""
+        try:
+            f = gzip.open(self.day_path(day), "rt")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    async def stream_day(self, day: str) -> AsyncIterator[dict]:
+        """iter_day off the event loop, ARCHIVE_READ_BATCH records per thread hop"""
+        records = self.iter_day(day)
+        try:
+            while True:
+                batch = await asyncio.to_thread(list, itertools.islice(records, ARCHIVE_READ_BATCH))
+                if not batch:
+                    return
+                for record in batch:
+                    yield record
+        finally:
+            records.close()
+
+    def _read_user(self, user_id: int, before: Optional[Tuple[datetime, int]], limit: int) -> List[dict]:
+        days = reversed(self.archived_days(user_id))
+        if before is not None:
+            before = (naive_utc(before[0]), before[1])
+
+        records: List[dict] = []
+        for day in days:
+            if before is not None and day > before[0].date().isoformat():
+                continue
+            # Files are in ascending order: keep only the newest rows still
+            # needed and stop at the cursor, so memory is bounded by the page
+            newest: Deque[dict] = deque(maxlen=limit - len(records))
+            for row in self.iter_day(day):
+                if before is not None and sort_key(row) >= before:
+                    break
+                if row["user_id"] == user_id:
+                    newest.append(row)
+            records.extend(reversed(newest))
+            if len(records) >= limit:
+                break
+        return records
+
+    async def read_user_activities(
+        self,
+        user_id: int,
+        before: Optional[Tuple[datetime, int]],
+        limit: int
+    ) -> List[dict]:
+        """A user's archived activities older than `before`, newest first"""
+        return await asyncio.to_thread(self._read_user, user_id, before, limit)
+
+    def archived_count(self, user_id: int) -> int:
+        """Number of archived activities for a user (from the manifest)"""
+        user_key = str(user_id)
+        return sum(info["users"].get(user_key, 0) for info in self._load_manifest()["days"].values())
+
+    # ============ Background job ============
+
+    async def start(self):
+        """Run the archiver periodically if enabled"""
+        if not settings.ACTIVITY_ARCHIVE_ENABLED:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop after the current batch, leaving the table and files consistent"""
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                moved = await self.run_once()
+                if moved:
+                    logger.info(f"Archived {moved} activities")
+            except Exception as e:
+                logger.error(f"Activity archival failed: {e}")
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=settings.ACTIVITY_ARCHIVE_INTERVAL_HOURS * 3600
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    def get_metrics(self) -> dict:
+        days = self._load_manifest()["days"]
+        return {
+            "enabled": self._task is not None,
+            "runs": self.runs,
+            "archived": self.archived,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "days": len(days),
+            "rows": sum(info["rows"] for info in days.values()),
+        }
+
+# Global activity archive instance
+activity_archive = ActivityArchive()
+
+async def main():
+    from app.database import close_db
+
+    moved = await activity_archive.run_once()
+    print(f"Archived {moved} activities to {activity_archive.root}")
+    await close_db()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+"""
+Shared Authentication Dependency
+
+Verified access tokens and the users they resolve to are cached in-process so
+authenticated hot-path requests skip JWT decoding and the users lookup.
+"""
+from fastapi import Depends, HTTPException, status, Header, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import Optional
+import logging
+import time
+
+from app.cache import TTLCache
+from app.database import get_read_session, read_router
+from app.models import User
+from app.security import verify_token
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# token -> user id
+token_cache = TTLCache(
+    max_entries=settings.AUTH_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.AUTH_CACHE_TTL_SECONDS,
+)
+# user id -> detached User row
+user_cache = TTLCache(
+    max_entries=settings.AUTH_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.AUTH_CACHE_TTL_SECONDS,
+)
+
+def verify_access_token(token: str) -> int:
+    """Verify a JWT and return its user id, using the token cache"""
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
+
+    payload = verify_token(token)
+    sub = payload.get("sub")
+    if not sub:
+        raise ValueError("Invalid token")
+
+    user_id = int(sub)
+    # Never cache a token past its own expiry
+    exp = payload.get("exp")
+    ttl = exp - time.time() if exp else None
+    token_cache.set(token, user_id, ttl_seconds=ttl)
+    return user_id
+
+def invalidate_user(user_id: int):
+    """Drop a cached user row after it has been modified"""
+    user_cache.pop(user_id)
+
+async def get_current_user(
+    request: Request,
+    authorization: str = Header(None),
+    db: AsyncSession = Depends(get_read_session)
+) -> User:
+    """Get current user from JWT token"""
+    if not authorization:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated"
+        )
+
+    try:
+        scheme, token = authorization.split()
+        if scheme.lower() != "bearer":
+            raise ValueError("Invalid scheme")
+
+        user_id = verify_access_token(token)
+
+        # Reads in this request follow the user to the primary after a write
+        if request.method not in ("GET", "HEAD", "OPTIONS"):
+            read_router.mark_write(user_id)
+        db.info["user_id"] = user_id
+
+        user: Optional[User] = user_cache.get(user_id)
+        if user is not None:
+            return user
+
+        result = await db.execute(
+            select(User).where(User.id == user_id)
+        )
+        user = result.scalar_one_or_none()
+
+        if not user:
+            raise ValueError("User not found")
+
+        # Cached rows are shared between requests, so keep them out of any session
+        db.expunge(user)
+        user_cache.set(user_id, user)
+        return user
+
+    except Exception as e:
+        logger.error(f"Auth error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials"
+        )
+
+def get_cache_metrics() -> dict:
+    """Token and user cache statistics"""
+    return {
+        "tokens": token_cache.get_stats(),
+        "users": user_cache.get_stats(),
+    }
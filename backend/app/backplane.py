@@ -0,0 +1,246 @@
+"""
+Cross-Process Event Backplane
+
+ConnectionManager only knows about sockets held by its own process. When the
+API runs with several workers, every broadcast is also published on a
+backplane so the other workers can deliver it to their sockets.
+
+- InProcessBackplane: single worker (default); publishing is local delivery.
+- SocketBackplane: connects to a small broker over a Unix or TCP socket that
+  relays each published frame to every other connected worker.
+
+Run the broker alongside the workers:
+
+    python -m app.backplane unix:///tmp/kywash-bus.sock
+
+and set WS_BACKPLANE_URL to the same address.
+
+Besides WebSocket events the backplane carries cache invalidations on
+CACHE_TOPIC (see app.cache_sync); those are never sent to clients.
+"""
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, Optional
+from urllib.parse import urlparse
+import argparse
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Called with (topic, message) for every event that should reach local sockets
+DeliverCallback = Callable[[Optional[str], dict], Awaitable[None]]
+
+STREAM_LIMIT = 4 * 1024 * 1024  # max bytes per relayed frame
+PEER_QUEUE_SIZE = 4096  # frames the broker buffers per worker before dropping it
+
+# Internal topic for cache invalidations between workers
+CACHE_TOPIC = "_cache"
+# Delivered locally on every broker (re)connect: invalidations may have been missed
+RESYNC_EVENT = {"cache": "all"}
+
+async def open_connection(url: str):
+    """Open a stream to a unix:// or tcp:// address"""
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        return await asyncio.open_unix_connection(parsed.path, limit=STREAM_LIMIT)
+    if parsed.scheme == "tcp":
+        return await asyncio.open_connection(parsed.hostname, parsed.port, limit=STREAM_LIMIT)
+    raise ValueError(f"Unsupported backplane URL: {url}")
+
+class Backplane(ABC):
+    """Delivers published events to every worker process"""
+
+    def __init__(self, deliver: Optional[DeliverCallback] = None):
+        self._deliver = deliver
+
+    async def start(self, deliver: DeliverCallback):
+        self._deliver = deliver
+
+    @abstractmethod
+    async def publish(self, topic: Optional[str], message: dict):
+        """Deliver an event locally and to every other worker"""
+
+    async def close(self):
+        pass
+
+    def get_metrics(self) -> dict:
+        return {"kind": type(self).__name__}
+
+class InProcessBackplane(Backplane):
+    """Single-process backplane: publishing is local delivery"""
+
+    async def publish(self, topic: Optional[str], message: dict):
+        await self._deliver(topic, message)
+
+class SocketBackplane(Backplane):
+    """Backplane client for the socket broker in this module"""
+
+    def __init__(self, url: str, reconnect_delay: float = 1.0):
+        super().__init__()
+        self.url = url
+        self.reconnect_delay = reconnect_delay
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self.published = 0
+        self.received = 0
+        self.publish_failures = 0
+
+    async def start(self, deliver: DeliverCallback):
+        await super().start(deliver)
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        """Keep a broker connection open and deliver relayed frames locally"""
+        while True:
+            try:
+                reader, self._writer = await open_connection(self.url)
+                logger.info(f"Connected to event backplane at {self.url}")
+                await self._deliver(CACHE_TOPIC, dict(RESYNC_EVENT))
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    envelope = json.loads(line)
+                    self.received += 1
+                    await self._deliver(envelope.get("topic"), envelope["message"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Event backplane connection error: {e}")
+            finally:
+                if self._writer is not None:
+                    self._writer.close()
+                    self._writer = None
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def publish(self, topic: Optional[str], message: dict):
+        # Local sockets never wait on the broker
+        await self._deliver(topic, message)
+
+        if self._writer is None:
+            self.publish_failures += 1
+            logger.warning("Event backplane unavailable, event delivered locally only")
+            return
+        try:
+            self._writer.write(json.dumps({"topic": topic, "message": message}).encode() + b"\n")
+            await self._writer.drain()
+            self.published += 1
+        except Exception as e:
+            self.publish_failures += 1
+            logger.warning(f"Failed to publish to event backplane: {e}")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_metrics(self) -> dict:
+        return {
+            "kind": type(self).__name__,
+            "url": self.url,
+            "connected": self._writer is not None,
+            "published": self.published,
+            "received": self.received,
+            "publish_failures": self.publish_failures,
+        }
+
+def create_backplane(url: Optional[str]) -> Backplane:
+    """Build the backplane configured by WS_BACKPLANE_URL"""
+    if not url:
+        return InProcessBackplane()
+    return SocketBackplane(url)
+
+# ============ Broker ============
+
+class BrokerPeer:
+    """One connected worker: a bounded outbound queue drained by its own task"""
+
+    def __init__(self, writer: asyncio.StreamWriter, queue_size: int):
+        self.writer = writer
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer_task: Optional[asyncio.Task] = None
+
+class BackplaneBroker:
+    """Relays every line received from one peer to all other peers
+
+    Each peer is written by its own task, so a slow or stalled worker only
+    delays itself; one that falls PEER_QUEUE_SIZE frames behind is dropped
+    (it reconnects and re-hydrates its caches).
+    """
+
+    def __init__(self, queue_size: int = PEER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.peers: Dict[asyncio.StreamWriter, BrokerPeer] = {}
+        self.dropped_peers = 0
+
+    async def handle_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = BrokerPeer(writer, self.queue_size)
+        peer.writer_task = asyncio.create_task(self._writer(peer))
+        self.peers[writer] = peer
+        logger.info(f"Backplane peer connected ({len(self.peers)} total)")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for other in list(self.peers.values()):
+                    if other is peer:
+                        continue
+                    try:
+                        other.queue.put_nowait(line)
+                    except asyncio.QueueFull:
+                        self.dropped_peers += 1
+                        logger.warning("Backplane peer fell behind, dropping it")
+                        self._drop(other)
+        except Exception as e:
+            logger.warning(f"Backplane peer read error: {e}")
+        finally:
+            self._drop(peer)
+            logger.info(f"Backplane peer disconnected ({len(self.peers)} total)")
+
+    async def _writer(self, peer: BrokerPeer):
+        """Drain one peer's queue"""
+        try:
+            while True:
+                line = await peer.queue.get()
+                peer.writer.write(line)
+                await peer.writer.drain()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._drop(peer)
+
+    def _drop(self, peer: BrokerPeer):
+        if self.peers.pop(peer.writer, None) is None:
+            return
+        if peer.writer_task is not None and peer.writer_task is not asyncio.current_task():
+            peer.writer_task.cancel()
+        peer.writer.close()
+
+    async def serve(self, url: str):
+        parsed = urlparse(url)
+        if parsed.scheme == "unix":
+            server = await asyncio.start_unix_server(self.handle_peer, parsed.path, limit=STREAM_LIMIT)
+        elif parsed.scheme == "tcp":
+            server = await asyncio.start_server(
+                self.handle_peer, parsed.hostname, parsed.port, limit=STREAM_LIMIT
+            )
+        else:
+            raise ValueError(f"Unsupported backplane URL: {url}")
+
+        logger.info(f"Backplane broker listening on {url}")
+        async with server:
+            await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="KY Wash event backplane broker")
+    parser.add_argument("url", help="unix:///path/to.sock or tcp://host:port")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(BackplaneBroker().serve(args.url))
@@ -0,0 +1,56 @@
+"""
+Cross-Worker Cache Sync
+
+The machine store, the waitlist cache and the auth user cache live in one
+process and are updated by the process that made the change. With several
+workers, each change is also published on the event backplane (CACHE_TOPIC)
+so the other workers reload the machine from the database or drop their
+cached waitlist/user. Whenever a worker (re)connects to the broker it
+re-hydrates everything, since invalidations sent while it was disconnected
+are lost. With a single worker publishing is a no-op.
+"""
+from typing import Optional
+import logging
+
+from app.machine_state import machine_store
+from app.waitlist_state import waitlist_store
+from app.auth import invalidate_user, user_cache
+from app.models import Machine
+from app.websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+
+async def machine_changed(machine: Machine):
+    """After commit: record a machine's new state here and in every other worker"""
+    machine_store.apply(machine)
+    await manager.publish_cache_event({
+        "cache": "machine",
+        "machine_type": machine.machine_type.value,
+        "machine_id": machine.machine_id,
+    })
+
+async def waitlist_changed(machine_type: str):
+    """After commit: drop a waitlist from every worker's cache"""
+    waitlist_store.invalidate(machine_type)
+    await manager.publish_cache_event({"cache": "waitlist", "machine_type": machine_type})
+
+async def user_changed(user_id: int):
+    """After commit: drop a user from every worker's auth cache"""
+    invalidate_user(user_id)
+    await manager.publish_cache_event({"cache": "user", "user_id": user_id})
+
+async def apply_cache_event(event: dict):
+    """Apply an invalidation published by another worker"""
+    kind: Optional[str] = event.get("cache")
+    if kind == "machine":
+        await machine_store.refresh(event["machine_type"], event["machine_id"])
+    elif kind == "waitlist":
+        waitlist_store.invalidate(event["machine_type"])
+    elif kind == "user":
+        invalidate_user(event["user_id"])
+    elif kind == "all":
+        await machine_store.hydrate()
+        waitlist_store.invalidate_all()
+        user_cache.clear()
+    else:
+        logger.warning(f"Unknown cache event: {event}")
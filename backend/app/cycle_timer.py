@@ -0,0 +1,263 @@
+"""
+Server-Side Cycle Timer Engine
+
+Each running machine has an absolute ``ends_at``. Pending completions are kept
+in a min-heap and a single task sleeps until the earliest one is due, so the
+cost is independent of how many timers are pending and there is no
+per-second polling loop. When a cycle ends the machine is moved to COMPLETED
+and the change is broadcast to connected clients.
+"""
+from sqlalchemy import select, update, and_
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from app.database import ReadSessionLocal
+from app.models import (
+    Machine, MachineStatus, ActivityType, Notification, NotificationType
+)
+from app import cache_sync
+from app.websocket_manager import manager
+from app.write_queue import run_unit_of_work
+from app.activity_log import activity_log
+from app.snapshot import count_unread
+
+logger = logging.getLogger(__name__)
+
+MachineKey = Tuple[str, int]  # (machine_type, machine_id)
+
+# Backoff before retrying a completion that failed (e.g. database busy)
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 60.0
+
+def as_utc(value: datetime) -> datetime:
+    """Stored datetimes are UTC but come back naive from SQLite; make them aware"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+def to_epoch(value: datetime) -> float:
+    """Convert a stored (naive UTC) datetime to a POSIX timestamp"""
+    return as_utc(value).timestamp()
+
+class CycleTimerEngine:
+    """Completes machine cycles when their ends_at passes"""
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, MachineKey]] = []
+        self._deadlines: Dict[MachineKey, float] = {}  # live deadline per machine
+        self._failures: Dict[MachineKey, int] = {}  # consecutive failed completions
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.completed = 0
+        self.unmatched = 0  # due machines the completion CAS did not match
+
+    def schedule(self, machine_type: str, machine_id: int, ends_at: datetime):
+        """Schedule (or reschedule) completion of a machine's cycle"""
+        key = (str(getattr(machine_type, "value", machine_type)), machine_id)
+        self._failures.pop(key, None)
+        self._push(key, to_epoch(ends_at))
+
+    def _push(self, key: MachineKey, deadline: float):
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), key))
+
+        # Wake the runner if this is now the earliest deadline
+        if self._wakeup is not None and self._heap[0][2] == key:
+            self._wakeup.set()
+
+    def cancel(self, machine_type: str, machine_id: int):
+        """Forget a pending completion; its heap entry is discarded lazily"""
+        key = (str(getattr(machine_type, "value", machine_type)), machine_id)
+        self._deadlines.pop(key, None)
+        self._failures.pop(key, None)
+
+    def pending_count(self) -> int:
+        """Number of machines with a pending completion"""
+        return len(self._deadlines)
+
+    async def start(self):
+        """Rebuild the schedule from the database and start the runner"""
+        self._heap.clear()
+        self._deadlines.clear()
+        self._failures.clear()
+        self._wakeup = asyncio.Event()
+        async with ReadSessionLocal() as db:
+            result = await db.execute(
+                select(Machine).where(
+                    and_(
+                        Machine.status == MachineStatus.IN_USE,
+                        Machine.ends_at.is_not(None)
+                    )
+                )
+            )
+            for machine in result.scalars().all():
+                self.schedule(machine.machine_type, machine.machine_id, machine.ends_at)
+
+        logger.info(f"Cycle timer started with {self.pending_count()} pending cycles")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the runner; pending cycles are rebuilt from the DB on next start"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._wakeup = None
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                deadline, _, key = heapq.heappop(self._heap)
+                # Skip entries that were cancelled or rescheduled
+                if self._deadlines.get(key) == deadline:
+                    del self._deadlines[key]
+                    due.append(key)
+
+            for key in due:
+                try:
+                    await self._complete(*key)
+                    self._failures.pop(key, None)
+                except Exception as e:
+                    self._retry(key, e)
+
+            self._wakeup.clear()
+            timeout = max(0.0, self._heap[0][0] - time.time()) if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _retry(self, key: MachineKey, error: Exception):
+        """Reschedule a failed completion with exponential backoff"""
+        if key in self._deadlines:
+            return  # rescheduled while completing; the new deadline stands
+        failures = self._failures.get(key, 0) + 1
+        self._failures[key] = failures
+        delay = min(RETRY_BASE_SECONDS * 2 ** (failures - 1), RETRY_MAX_SECONDS)
+        logger.error(
+            f"Error completing cycle for {key[0]} {key[1]} (attempt {failures}), "
+            f"retrying in {delay:.1f}s: {error}"
+        )
+        self._push(key, time.time() + delay)
+
+    async def _complete(self, machine_type: str, machine_id: int):
+        """Move a machine to COMPLETED if its cycle is still running and due"""
+        async def complete(db):
+            now = datetime.now(timezone.utc)
+            result = await db.execute(
+                update(Machine)
+                .where(
+                    and_(
+                        Machine.machine_type == machine_type,
+                        Machine.machine_id == machine_id,
+                        Machine.status == MachineStatus.IN_USE,
+                        Machine.ends_at <= now
+                    )
+                )
+                .values(
+                    status=MachineStatus.COMPLETED,
+                    time_left_seconds=0,
+                    ends_at=None
+                )
+                .returning(Machine)
+            )
+            machine = result.scalar_one_or_none()
+            if machine is None:
+                # Cancelled, ended manually or rescheduled since it was queued,
+                # unless the machine is still running and due (clock mismatch)
+                ends_at = await db.scalar(
+                    select(Machine.ends_at).where(
+                        and_(
+                            Machine.machine_type == machine_type,
+                            Machine.machine_id == machine_id,
+                            Machine.status == MachineStatus.IN_USE
+                        )
+                    )
+                )
+                if ends_at is not None and as_utc(ends_at) <= now:
+                    self.unmatched += 1
+                    logger.warning(
+                        f"{machine_type} {machine_id} is due ({as_utc(ends_at).isoformat()}) "
+                        f"but the completion matched no row"
+                    )
+                return None, None, None, None
+
+            activity = notification = unread_count = None
+            if machine.current_user_id:
+                activity = activity_log.record(
+                    db,
+                    user_id=machine.current_user_id,
+                    activity_type=ActivityType.MACHINE_COMPLETED,
+                    machine_type=machine.machine_type,
+                    machine_id=machine.machine_id,
+                    details=f"Cycle completed: {machine.current_category}"
+                )
+                notification = Notification(
+                    user_id=machine.current_user_id,
+                    notification_type=NotificationType.CYCLE_COMPLETE,
+                    title="Cycle complete",
+                    message=f"Your laundry in {machine.machine_type.value} {machine.machine_id} is done",
+                    machine_type=machine.machine_type,
+                    machine_id=machine.machine_id
+                )
+                db.add(notification)
+                await db.flush()
+                unread_count = await count_unread(db, machine.current_user_id)
+            return machine, activity, notification, unread_count
+
+        machine, activity, notification, unread_count = await run_unit_of_work(complete)
+        if machine is None:
+            return
+        await cache_sync.machine_changed(machine)
+        self.completed += 1
+
+        logger.info(f"Machine {machine_type} {machine_id} cycle completed by timer")
+
+        await manager.broadcast_machine_update({
+            "machine_id": machine.machine_id,
+            "machine_type": machine.machine_type,
+            "status": machine.status,
+            "time_left_seconds": 0,
+            "ends_at": None,
+            "current_user_id": machine.current_user_id
+        })
+
+        if notification is not None:
+            await manager.broadcast_notification(machine.current_user_id, {
+                "id": notification.id,
+                "notification_type": notification.notification_type,
+                "title": notification.title,
+                "message": notification.message,
+                "machine_type": notification.machine_type,
+                "machine_id": notification.machine_id
+            })
+            await manager.broadcast_unread_count(machine.current_user_id, unread_count)
+
+        if activity is not None:
+            await activity_log.publish(activity)
+
+    def get_metrics(self) -> dict:
+        """Pending and completed timer counts"""
+        next_due = self._heap[0][0] - time.time() if self._heap else None
+        return {
+            "pending": self.pending_count(),
+            "heap_size": len(self._heap),
+            "completed": self.completed,
+            "retrying": len(self._failures),
+            "unmatched": self.unmatched,
+            "next_due_in_seconds": round(next_due, 1) if next_due is not None else None,
+        }
+
+# Global cycle timer instance
+cycle_timer = CycleTimerEngine()
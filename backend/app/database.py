@@ -2,47 +2,236 @@
 Database Configuration and Connection Management
 """
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import declarative_base
+from sqlalchemy import select, event, inspect, text
+from sqlalchemy.orm import declarative_base, Session
 from sqlalchemy.pool import StaticPool
+from typing import Dict, Optional
+import time
+from app.db_pool import InstrumentedAsyncPool
 from config import settings
-import os
 
 # Create base class for models
 Base = declarative_base()
 
-# Async engine
-if settings.DATABASE_URL.startswith("sqlite"):
-    # For SQLite, use StaticPool for async support
+def _aiosqlite_url(url: str, read_only: bool = False) -> str:
+    """sqlite:///path -> sqlite+aiosqlite:///path, optionally as a read-only URI"""
+    path = url.split(":///", 1)[1]
+    if read_only:
+        return f"sqlite+aiosqlite:///file:{path}?mode=ro&uri=true"
+    return f"sqlite+aiosqlite:///{path}"
+
+def _sqlite_pragmas(read_only: bool):
+    """Connect hook applying the SQLite tuning pragmas"""
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not read_only:
+            cursor.execute("PRAGMA journal_mode=WAL")  # persistent; readers no longer block on the writer
+        cursor.execute("PRAGMA synchronous=NORMAL")  # fsync at checkpoints, not every commit
+        cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+        if not read_only:
+            _sqlite_manual_begin(dbapi_connection, connection_record)
+    return set_pragmas
+
+def _sqlite_manual_begin(dbapi_connection, connection_record):
+    """Stop the driver's implicit BEGIN so SAVEPOINTs nest inside our own"""
+    dbapi_connection.isolation_level = None
+
+def _sqlite_begin(conn):
+    """Take the write lock up front instead of upgrading mid-transaction"""
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+def _postgres_engine(url: str):
+    """Pooled asyncpg engine using the DB_POOL_* settings"""
+    return create_async_engine(
+        url.replace("postgresql://", "postgresql+asyncpg://"),
+        echo=settings.SQLALCHEMY_ECHO,
+        poolclass=InstrumentedAsyncPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+
+# Async engines: writes go through `engine`; reads may use `read_engine`
+if settings.DATABASE_URL.startswith("sqlite") and ":memory:" in settings.DATABASE_URL:
+    # In-memory SQLite only exists on one connection, so share it
     engine = create_async_engine(
-        settings.DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite:///"),
+        "sqlite+aiosqlite:///:memory:",
         echo=settings.SQLALCHEMY_ECHO,
         poolclass=StaticPool,
         connect_args={"check_same_thread": False},
     )
-else:
-    # For PostgreSQL
+    event.listen(engine.sync_engine, "connect", _sqlite_manual_begin)
+    event.listen(engine.sync_engine, "begin", _sqlite_begin)
+    read_engine = engine
+elif settings.DATABASE_URL.startswith("sqlite"):
+    # SQLite has a single writer: one dedicated writer connection, so each
+    # write transaction has it to itself, plus a pool of read-only
+    # connections that WAL lets run alongside the writer
     engine = create_async_engine(
-        settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://"),
+        _aiosqlite_url(settings.DATABASE_URL),
         echo=settings.SQLALCHEMY_ECHO,
-        pool_size=20,
+        poolclass=InstrumentedAsyncPool,
+        pool_size=1,
         max_overflow=0,
+        connect_args={"check_same_thread": False},
     )
+    event.listen(engine.sync_engine, "connect", _sqlite_pragmas(read_only=False))
+    event.listen(engine.sync_engine, "begin", _sqlite_begin)
+
+    read_engine = create_async_engine(
+        _aiosqlite_url(settings.DATABASE_URL, read_only=True),
+        echo=settings.SQLALCHEMY_ECHO,
+        poolclass=InstrumentedAsyncPool,
+        pool_size=settings.SQLITE_READ_POOL_SIZE,
+        max_overflow=0,
+        connect_args={"check_same_thread": False},
+    )
+    event.listen(read_engine.sync_engine, "connect", _sqlite_pragmas(read_only=True))
+else:
+    # For PostgreSQL
+    engine = _postgres_engine(settings.DATABASE_URL)
+    read_engine = engine
+
+# Optional read replica for GET routes; replication lag is hidden from a user
+# who just wrote by sending their reads to `read_engine` for a short while
+replica_engine = _postgres_engine(settings.DATABASE_REPLICA_URL) if settings.DATABASE_REPLICA_URL else None
 
-# Async session factory
+class ReadRouter:
+    """Tracks recent writers so their reads see their own writes"""
+
+    def __init__(self):
+        self._sticky_until: Dict[int, float] = {}
+        self.replica_reads = 0
+        self.primary_reads = 0
+
+    def mark_write(self, user_id: Optional[int]):
+        """Send this user's reads to the primary for READ_STICKY_SECONDS"""
+        if replica_engine is None or user_id is None:
+            return
+        now = time.monotonic()
+        if len(self._sticky_until) > 10000:
+            self._sticky_until = {uid: until for uid, until in self._sticky_until.items() if until > now}
+        self._sticky_until[user_id] = now + settings.READ_STICKY_SECONDS
+
+    def use_primary(self, user_id: Optional[int]) -> bool:
+        if user_id is None:
+            return False
+        return self._sticky_until.get(user_id, 0) > time.monotonic()
+
+    def get_metrics(self) -> dict:
+        return {
+            "replica": replica_engine is not None,
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "sticky_users": sum(1 for until in self._sticky_until.values() if until > time.monotonic()),
+        }
+
+# Global read router instance
+read_router = ReadRouter()
+
+class RoutingSession(Session):
+    """Picks the replica or the primary per statement, by session.info["user_id"]"""
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if read_router.use_primary(self.info.get("user_id")):
+            read_router.primary_reads += 1
+            return read_engine.sync_engine
+        read_router.replica_reads += 1
+        return replica_engine.sync_engine
+
+# Async session factories
 AsyncSessionLocal = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
+ReadSessionLocal = async_sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False
+)
+if replica_engine is not None:
+    ReplicaSessionLocal = async_sessionmaker(
+        class_=AsyncSession, sync_session_class=RoutingSession, expire_on_commit=False
+    )
+else:
+    ReplicaSessionLocal = ReadSessionLocal
 
 async def get_db_session() -> AsyncSession:
     """Dependency for getting database session"""
     async with AsyncSessionLocal() as session:
         yield session
 
+async def get_read_session() -> AsyncSession:
+    """Dependency for GET routes: replica if configured, else the reader pool/primary"""
+    async with ReplicaSessionLocal() as session:
+        yield session
+
+def get_pool_metrics() -> dict:
+    """Connection pool metrics per engine"""
+    engines = {"writer": engine, "reader": read_engine}
+    if read_engine is engine:
+        engines = {"primary": engine}
+    if replica_engine is not None:
+        engines["replica"] = replica_engine
+    return {
+        name: pool_engine.pool.get_metrics()
+        for name, pool_engine in engines.items()
+        if isinstance(pool_engine.pool, InstrumentedAsyncPool)
+    }
+
+def _add_missing_columns(conn):
+    """create_all skips tables that already exist, so add new (nullable) columns to them"""
+    inspector = inspect(conn)
+    compiler = conn.dialect.ddl_compiler(conn.dialect, None)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            conn.execute(text(
+                f"ALTER TABLE {table.name} ADD COLUMN {compiler.get_column_specification(column)}"
+            ))
+
+def _create_missing_indexes(conn):
+    """create_all skips tables that already exist, so add new indexes to them"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
 async def init_db():
     """Initialize database tables"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_create_missing_indexes)
+
+async def seed_machines():
+    """Provision MACHINES_PER_TYPE machines of each type, adding any that are missing"""
+    from app.models import Machine, MachineType, MachineStatus
+    
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(Machine.machine_type, Machine.machine_id))
+        existing = set(result.all())
+        
+        missing = [
+            Machine(machine_id=i, machine_type=machine_type, status=MachineStatus.AVAILABLE)
+            for machine_type in MachineType
+            for i in range(1, settings.MACHINES_PER_TYPE + 1)
+            if (machine_type, i) not in existing
+        ]
+        if missing:
+            session.add_all(missing)
+            await session.commit()
+        return len(missing)
 
 async def close_db():
-    """Close database connection"""
+    """Close database connections"""
+    if replica_engine is not None:
+        await replica_engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
     await engine.dispose()
@@ -0,0 +1,77 @@
+"""
+Instrumented Connection Pool
+
+A drop-in AsyncAdaptedQueuePool that records how long requests wait to check
+out a connection, how often the pool has to open overflow connections and
+how often checkout times out. Exposed through /api/metrics so pool size,
+overflow and timeout can be tuned per deployment.
+"""
+from collections import deque
+from typing import Deque, Optional
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Checkouts slower than this count as having waited for a connection
+WAIT_THRESHOLD_SECONDS = 0.001
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """Queue pool that measures checkout wait time, overflow and timeouts"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.overflow_opens = 0
+        self.max_checked_out = 0
+        self._wait_times: Deque[float] = deque(maxlen=1000)
+
+    def _do_get(self):
+        started = time.perf_counter()
+        overflow_before = self._overflow
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+
+        waited = time.perf_counter() - started
+        self.checkouts += 1
+        self._wait_times.append(waited)
+        if waited > WAIT_THRESHOLD_SECONDS:
+            self.waits += 1
+        # _overflow counts up from -pool_size; above zero means past pool_size
+        if self._overflow > max(overflow_before, 0):
+            self.overflow_opens += 1
+        self.max_checked_out = max(self.max_checked_out, self.checkedout())
+        return record
+
+    def get_metrics(self) -> dict:
+        """Current occupancy plus checkout wait, overflow and timeout counters"""
+        def percentile(samples, p: float) -> Optional[float]:
+            if not samples:
+                return None
+            ordered = sorted(samples)
+            return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+        p50 = percentile(self._wait_times, 0.50)
+        p99 = percentile(self._wait_times, 0.99)
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "idle": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "max_checked_out": self.max_checked_out,
+            "checkouts": self.checkouts,
+            "waits": self.waits,
+            "timeouts": self.timeouts,
+            "overflow_opens": self.overflow_opens,
+            "wait_ms": {
+                "p50": round(p50 * 1000, 3) if p50 is not None else None,
+                "p99": round(p99 * 1000, 3) if p99 is not None else None,
+                "max": round(max(self._wait_times) * 1000, 3) if self._wait_times else None,
+            },
+        }
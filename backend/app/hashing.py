@@ -0,0 +1,117 @@
+"""
+Password Hashing Executor
+
+bcrypt is deliberately slow, so hashing and verifying PINs on the event loop
+stalls every other request and WebSocket broadcast. This module runs them on
+a bounded worker pool and rejects new work once the backlog is full.
+"""
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from collections import deque
+from typing import Optional, Deque
+import asyncio
+import logging
+import time
+
+from config import settings
+from app.security import hash_password, verify_password
+
+logger = logging.getLogger(__name__)
+
+class HashingBackpressureError(Exception):
+    """Raised when the hashing queue is full and new work must be rejected"""
+
+class HashingExecutor:
+    """Runs bcrypt hash/verify calls on a bounded thread or process pool"""
+
+    def __init__(self, kind: str = "thread", max_workers: int = 4, max_queue: int = 64):
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[Executor] = None
+
+        # Metrics
+        self.pending = 0  # submitted but not yet finished (running + queued)
+        self.completed = 0
+        self.rejected = 0
+        self._latencies: Deque[float] = deque(maxlen=1000)
+
+    def _get_executor(self) -> Executor:
+        """Create the worker pool lazily on first use"""
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="hashing",
+                )
+            logger.info(f"Hashing executor started ({self.kind}, {self.max_workers} workers)")
+        return self._executor
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of submissions waiting for a free worker"""
+        return max(0, self.pending - self.max_workers)
+
+    async def _run(self, func, *args):
+        """Submit a call to the pool, applying backpressure when it is saturated"""
+        if self.pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise HashingBackpressureError("Hashing queue is full")
+
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+            self._latencies.append(time.perf_counter() - started)
+
+    async def hash_password(self, password: str) -> str:
+        """Hash a password off the event loop"""
+        return await self._run(hash_password, password)
+
+    async def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify a password off the event loop"""
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def get_metrics(self) -> dict:
+        """Queue depth and latency figures (latency includes time spent queued)"""
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            index = min(len(latencies) - 1, int(round(p * (len(latencies) - 1))))
+            return round(latencies[index] * 1000, 2)
+
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.pending,
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "latency_ms": {
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": round(latencies[-1] * 1000, 2) if latencies else None,
+            },
+        }
+
+    def shutdown(self):
+        """Stop the worker pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Global hashing executor instance
+hash_executor = HashingExecutor(
+    kind=settings.HASH_EXECUTOR_KIND,
+    max_workers=settings.HASH_EXECUTOR_WORKERS,
+    max_queue=settings.HASH_EXECUTOR_MAX_QUEUE,
+)
@@ -0,0 +1,103 @@
+"""
+In-Memory Machine State Store
+
+There are only a handful of machines and every client polls them, so the
+process keeps an authoritative copy of each machine that is hydrated at
+startup and updated by the routes that change machine state. Reads are served
+from pre-serialized JSON without touching the database. With several
+workers, changes reach the other workers' stores through app.cache_sync.
+"""
+from sqlalchemy import select
+from typing import Dict, Optional, Tuple
+import json
+import logging
+
+from app.database import ReadSessionLocal
+from app.models import Machine, MachineType
+from app.schemas import MachineResponse
+
+logger = logging.getLogger(__name__)
+
+MachineKey = Tuple[str, int]  # (machine_type, machine_id)
+
+class MachineStateStore:
+    """Process-level cache of machine state with snapshot reads"""
+
+    def __init__(self):
+        self._machines: Dict[MachineKey, dict] = {}
+        self._machine_json: Dict[MachineKey, bytes] = {}
+        self._list_json: Optional[bytes] = None
+        self._writes: Dict[MachineKey, int] = {}  # per-machine change counter, guards refreshes
+        self.version = 0  # bumped on every change
+
+    async def hydrate(self):
+        """Load every machine from the database"""
+        async with ReadSessionLocal() as db:
+            result = await db.execute(select(Machine))
+            machines = result.scalars().all()
+
+        self._machines.clear()
+        self._machine_json.clear()
+        for machine in machines:
+            self._put(machine)
+        self._invalidate()
+        logger.info(f"Machine state hydrated with {len(self._machines)} machines")
+
+    def _put(self, machine: Machine):
+        data = MachineResponse.model_validate(machine).model_dump(mode="json")
+        key = (data["machine_type"], data["machine_id"])
+        self._machines[key] = data
+        self._machine_json[key] = json.dumps(data).encode()
+
+    def _invalidate(self):
+        self._list_json = None
+        self.version += 1
+
+    def apply(self, machine: Machine):
+        """Record the committed state of a machine"""
+        key = (machine.machine_type.value, machine.machine_id)
+        self._writes[key] = self._writes.get(key, 0) + 1
+        self._put(machine)
+        self._invalidate()
+
+    async def refresh(self, machine_type: str, machine_id: int):
+        """Reload one machine another worker changed"""
+        key = (machine_type, machine_id)
+        self._writes[key] = token = self._writes.get(key, 0) + 1
+        async with ReadSessionLocal() as db:
+            result = await db.execute(
+                select(Machine).where(
+                    Machine.machine_type == MachineType(machine_type),
+                    Machine.machine_id == machine_id
+                )
+            )
+            machine = result.scalar_one_or_none()
+        # A newer apply/refresh finished first; don't overwrite it with this read
+        if machine is not None and self._writes[key] == token:
+            self._put(machine)
+            self._invalidate()
+
+    def get(self, machine_type: str, machine_id: int) -> Optional[dict]:
+        """Current state of one machine"""
+        return self._machines.get((machine_type, machine_id))
+
+    def machine_json(self, machine_type: str, machine_id: int) -> Optional[bytes]:
+        """Pre-serialized state of one machine"""
+        return self._machine_json.get((machine_type, machine_id))
+
+    def list_data(self) -> dict:
+        """All machines grouped by type, ordered by machine_id"""
+        ordered = sorted(self._machines.items(), key=lambda item: item[0][1])
+        return {
+            "washers": [data for (machine_type, _), data in ordered if machine_type == MachineType.WASHER.value],
+            "dryers": [data for (machine_type, _), data in ordered if machine_type == MachineType.DRYER.value],
+        }
+
+    def list_json(self) -> bytes:
+        """Pre-serialized machine list, rebuilt only after a change"""
+        if self._list_json is None:
+            self._list_json = json.dumps(self.list_data()).encode()
+        return self._list_json
+
+# Global machine state store instance
+machine_store = MachineStateStore()
@@ -1,15 +1,31 @@
 """
 Main FastAPI Application
 """
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, status
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, Header, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import JSONResponse
+from starlette.websockets import WebSocketState
 from contextlib import asynccontextmanager
 from config import settings
-from app.database import init_db, close_db, get_db_session
-from app.websocket_manager import manager
+from app.database import init_db, close_db, get_db_session, seed_machines, get_pool_metrics, read_router
+from app.websocket_manager import manager, WS_CLOSE_AUTH_FAILED
+from app.hashing import hash_executor
+from app.auth import get_cache_metrics, verify_access_token
+from app.machine_state import machine_store
+from app.cycle_timer import cycle_timer
+from app.waitlist_state import waitlist_store
+from app.snapshot import build_snapshot
+from app.cache_sync import apply_cache_event
+from app.write_queue import group_writer
+from app.activity_log import activity_log
+from app.archive import activity_archive
+from jose import JWTError
+import asyncio
+import hmac
 import logging
+import os
+import time
 from datetime import datetime
 
 # Configure logging
@@ -23,9 +39,24 @@ async def lifespan(app: FastAPI):
     logger.info("Starting up...")
     await init_db()
     logger.info("Database initialized")
+    created = await seed_machines()
+    if created:
+        logger.info(f"Provisioned {created} machines")
+    await machine_store.hydrate()
+    await group_writer.start()
+    await activity_log.start()
+    await activity_archive.start()
+    await cycle_timer.start()
+    await manager.start(snapshot=build_snapshot, cache_handler=apply_cache_event)
     yield
     # Shutdown
     logger.info("Shutting down...")
+    await manager.stop()
+    await cycle_timer.stop()
+    await activity_archive.stop()
+    await activity_log.stop()
+    await group_writer.stop()
+    hash_executor.shutdown()
     await close_db()
     logger.info("Database closed")
 
@@ -66,6 +97,55 @@ async def health_check():
         "active_connections": manager.get_connection_count()
     }
 
+def process_usage() -> dict:
+    """CPU time and resident memory of this worker, where the platform reports it"""
+    rss_mb = None
+    try:
+        with open("/proc/self/statm") as f:
+            rss_pages = int(f.read().split()[1])
+        rss_mb = round(rss_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    connections = manager.get_connection_count()
+    return {
+        "cpu_seconds": round(time.process_time(), 3),
+        "rss_mb": rss_mb,
+        "rss_per_connection_kb": (
+            round(rss_mb * 1024 / connections, 1) if rss_mb is not None and connections else None
+        ),
+    }
+
+def require_metrics_token(authorization: str = Header(default="")):
+    """Metrics are only served with METRICS_TOKEN as the bearer token"""
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token, settings.METRICS_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+@app.get("/api/metrics", dependencies=[Depends(require_metrics_token)])
+async def metrics():
+    """Runtime metrics for capacity tuning"""
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "process": process_usage(),
+        "hashing": hash_executor.get_metrics(),
+        "auth_cache": get_cache_metrics(),
+        "cycle_timer": cycle_timer.get_metrics(),
+        "waitlist_cache": waitlist_store.get_metrics(),
+        "group_commit": group_writer.get_metrics(),
+        "activity_log": activity_log.get_metrics(),
+        "activity_archive": activity_archive.get_metrics(),
+        "db_pool": get_pool_metrics(),
+        "read_routing": read_router.get_metrics(),
+        "websocket": manager.get_metrics(),
+    }
+
 # ============ API Routes ============
 
 # Import routes
@@ -74,6 +154,7 @@ from app.routes.machines import router as machines_router
 from app.routes.waitlist import router as waitlist_router
 from app.routes.faults import router as faults_router
 from app.routes.activities import activities_router, profile_router, notifications_router
+from app.routes.exports import router as exports_router
 
 # Include routes
 app.include_router(auth_router)
@@ -83,43 +164,92 @@ app.include_router(faults_router)
 app.include_router(activities_router)
 app.include_router(profile_router)
 app.include_router(notifications_router)
+app.include_router(exports_router)
 
 # ============ WebSocket ============
 
+async def receive_first_frame(websocket: WebSocket) -> dict:
+    """The client's first frame, or {} if it sends none within WS_AUTH_TIMEOUT"""
+    try:
+        message = await asyncio.wait_for(websocket.receive_json(), timeout=settings.WS_AUTH_TIMEOUT)
+    except asyncio.TimeoutError:
+        return {}
+    return message if isinstance(message, dict) else {}
+
 @app.websocket("/api/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for real-time updates"""
+    """WebSocket endpoint for real-time updates
+
+    Authenticate with ?token=<access token> or a first frame
+    {"token": "<access token>", ...}. Without a token only the public topics
+    are available. The first frame (or WS_AUTH_TIMEOUT without one) also
+    decides between a resume and a full snapshot, whichever way the client
+    authenticated.
+    """
     user_id = None
     try:
-        # Accept connection
-        await manager.connect(websocket)
+        # Optional ?topics=machines:washer,activities narrows the default subscriptions
+        topics_param = websocket.query_params.get("topics")
+        topics = [t for t in topics_param.split(",") if t] if topics_param else None
+        # Optional ?encoding=msgpack for binary frames; JSON otherwise
+        encoding = websocket.query_params.get("encoding", "json")
         
-        # First message should contain user_id (for authentication)
-        initial_message = await websocket.receive_json()
-        user_id = initial_message.get("user_id")
+        initial_message = None
+        token = websocket.query_params.get("token")
+        if token is None:
+            if not manager.has_capacity():
+                await manager.connect(websocket)  # refuses and counts it
+                return
+            # The token (and any resume/subscribe request) comes in the first frame
+            await websocket.accept()
+            initial_message = await receive_first_frame(websocket)
+            token = initial_message.get("token")
         
+        if token:
+            try:
+                user_id = verify_access_token(token)
+            except (JWTError, ValueError):
+                logger.warning("WebSocket refused, invalid token")
+                # Accept first: a handshake rejection reaches the browser as 1006, not our code
+                if websocket.client_state == WebSocketState.CONNECTING:
+                    await websocket.accept()
+                await websocket.close(code=WS_CLOSE_AUTH_FAILED)
+                return
+        
+        # Register exactly once, with the authenticated user
+        if not await manager.connect(websocket, user_id, topics=topics, encoding=encoding):
+            return
         if user_id:
-            # Re-register with user_id for targeted messages
-            await manager.connect(websocket, user_id)
             logger.info(f"User {user_id} connected to WebSocket")
         
+        if initial_message is None:
+            # Authenticated by query string; a resume request may still follow
+            initial_message = await receive_first_frame(websocket)
+        await manager.handle_client_message(websocket, initial_message)
+        
+        # A resuming client gets its missed events instead of the full state
+        if initial_message.get("action") != "resume":
+            await manager.send_snapshot(websocket)
+        
         # Keep connection alive and handle incoming messages
         while True:
             try:
                 data = await websocket.receive_json()
-                # Handle any incoming messages if needed
                 logger.debug(f"WebSocket message received: {data}")
+                await manager.handle_client_message(websocket, data)
+            except WebSocketDisconnect:
+                raise
             except Exception as e:
                 logger.error(f"Error receiving message: {e}")
                 break
     
     except WebSocketDisconnect:
-        manager.disconnect(websocket, user_id)
         if user_id:
             logger.info(f"User {user_id} disconnected from WebSocket")
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
-        manager.disconnect(websocket, user_id)
+    finally:
+        manager.disconnect(websocket)
 
 # ============ Exception Handlers ============
 
@@ -130,7 +260,8 @@ async def http_exception_handler(request, exc):
         content={
             "detail": exc.detail,
             "status_code": exc.status_code
-        }
+        },
+        headers=getattr(exc, "headers", None)
     )
 
 @app.exception_handler(Exception)
@@ -166,6 +297,7 @@ async def api_info():
         "description": settings.API_DESCRIPTION,
         "endpoints": {
             "health": "/api/health",
+            "metrics": "/api/metrics",
             "docs": "/api/docs",
             "auth": "/api/v1/auth/*",
             "machines": "/api/v1/machines/*",
@@ -183,5 +315,6 @@ if __name__ == "__main__":
         "app.main:app",
         host=settings.SERVER_HOST,
         port=settings.SERVER_PORT,
-        reload=settings.DEBUG
+        reload=settings.DEBUG,
+        ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE
     )
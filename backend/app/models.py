@@ -1,13 +1,34 @@
 """
 SQLAlchemy Models for KY Wash Backend
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Enum, Float, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Enum, Float, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from database import Base
+from sqlalchemy.dialects import sqlite
+from app.database import Base
 from datetime import datetime
 import enum
 
+class SQLiteTimestamp(sqlite.DATETIME):
+    """SQLite's CURRENT_TIMESTAMP text ("YYYY-MM-DD HH:MM:SS"), plus ".ffffff" when non-zero
+
+    Whole-second values bind exactly like server defaults, so keyset
+    comparisons line up, while rows stamped within the same second still
+    sort by time rather than by insert order. The text sorts in time order.
+    """
+
+    def bind_processor(self, dialect):
+        process = super().bind_processor(dialect)
+
+        def bind(value):
+            value = process(value)
+            if value is not None and value.endswith(".000000"):
+                value = value[:-7]
+            return value
+        return bind
+
+Timestamp = DateTime(timezone=True).with_variant(SQLiteTimestamp(), "sqlite")
+
 class MachineType(str, enum.Enum):
     WASHER = "washer"
     DRYER = "dryer"
@@ -70,7 +91,8 @@ class Machine(Base):
     machine_type = Column(Enum(MachineType), nullable=False)
     status = Column(Enum(MachineStatus), default=MachineStatus.AVAILABLE, nullable=False)
     current_category = Column(Enum(CycleCategory), nullable=True)
-    time_left_seconds = Column(Integer, default=0)
+    time_left_seconds = Column(Integer, default=0)  # Cycle length when last started
+    ends_at = Column(DateTime(timezone=True), nullable=True)  # Absolute end of running cycle (UTC)
     current_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     enabled = Column(Boolean, default=True)
     total_cycles = Column(Integer, default=0)
@@ -85,6 +107,7 @@ class Machine(Base):
     __table_args__ = (
         # Unique constraint on machine_id and machine_type combination
         # which gives us a unique identifier per physical machine
+        Index("ix_machines_type_machine_id", "machine_type", "machine_id", unique=True),
     )
 
 class WaitlistItem(Base):
@@ -107,7 +130,7 @@ class FaultReport(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     description = Column(Text, nullable=False)
     photo_data = Column(Text, nullable=True)  # Base64 encoded photo
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(Timestamp, server_default=func.now())
     
     # Relationships
     machine = relationship("Machine", back_populates="fault_reports")
@@ -122,10 +145,16 @@ class Activity(Base):
     machine_type = Column(Enum(MachineType), nullable=True)
     machine_id = Column(Integer, nullable=True)
     details = Column(Text, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(Timestamp, server_default=func.now())
     
     # Relationships
     user = relationship("User", back_populates="activities")
+    
+    __table_args__ = (
+        # Keyset pagination of the global and per-user feeds on (created_at, id)
+        Index("ix_activities_created_at_id", "created_at", "id"),
+        Index("ix_activities_user_id_created_at", "user_id", "created_at", "id"),
+    )
 
 class Notification(Base):
     __tablename__ = "notifications"
@@ -138,10 +167,17 @@ class Notification(Base):
     is_read = Column(Boolean, default=False)
     machine_type = Column(Enum(MachineType), nullable=True)
     machine_id = Column(Integer, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(Timestamp, server_default=func.now())
     
     # Relationships
     user = relationship("User", back_populates="notifications")
+    
+    __table_args__ = (
+        # Keyset pagination of a user's notifications on (created_at, id)
+        Index("ix_notifications_user_id_created_at", "user_id", "created_at", "id"),
+        # Covers the unread count, so it never reads the table rows
+        Index("ix_notifications_user_id_is_read", "user_id", "is_read"),
+    )
 
 class Session(Base):
     __tablename__ = "sessions"
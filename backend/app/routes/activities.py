@@ -1,18 +1,25 @@
 """
 User Activities and Profile Management Routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Header
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
-from app.database import get_db_session
-from app.models import User, Activity, Notification
+from sqlalchemy import select, update, delete, desc, func, tuple_, literal
+from app.database import get_read_session
+from app.write_queue import run_unit_of_work
+from app.models import User, Activity, Notification, NotificationType
 from app.schemas import (
     UserResponse, UpdateProfileRequest, UpdateProfileResponse,
     ActivityFeedResponse, ActivityResponse, NotificationsResponse,
-    NotificationResponse
+    NotificationResponse, BulkNotificationRequest, BulkNotificationResponse
 )
-from app.security import verify_token
+from app.auth import get_current_user
 from app.websocket_manager import manager
+from app.archive import activity_archive
+from app.snapshot import count_unread
+from app import cache_sync
+from datetime import datetime
+from typing import Optional, Tuple
+import base64
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,47 +29,6 @@ activities_router = APIRouter(prefix="/api/v1/activities", tags=["activities"])
 profile_router = APIRouter(prefix="/api/v1/profile", tags=["profile"])
 notifications_router = APIRouter(prefix="/api/v1/notifications", tags=["notifications"])
 
-# ============ Dependency for current user ============
-
-async def get_current_user(
-    authorization: str = Header(None),
-    db: AsyncSession = Depends(get_db_session)
-):
-    """Get current user from JWT token"""
-    if not authorization:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authenticated"
-        )
-    
-    try:
-        scheme, token = authorization.split()
-        if scheme.lower() != "bearer":
-            raise ValueError("Invalid scheme")
-        
-        payload = verify_token(token)
-        user_id = payload.get("sub")
-        
-        if not user_id:
-            raise ValueError("Invalid token")
-        
-        result = await db.execute(
-            select(User).where(User.id == int(user_id))
-        )
-        user = result.scalar_one_or_none()
-        
-        if not user:
-            raise ValueError("User not found")
-        
-        return user
-    
-    except Exception as e:
-        logger.error(f"Auth error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials"
-        )
-
 # ============ Profile Endpoints ============
 
 @profile_router.get("/me", response_model=UserResponse)
@@ -82,29 +48,31 @@ async def get_profile(
 @profile_router.put("/update", response_model=UpdateProfileResponse)
 async def update_profile(
     request: UpdateProfileRequest,
-    db: AsyncSession = Depends(get_db_session),
     current_user: User = Depends(get_current_user)
 ):
     """Update user profile"""
+    async def update_phone(db: AsyncSession) -> User:
+        # current_user may be a shared cached row, so update a session-bound copy
+        user = await db.merge(current_user, load=False)
+        user.phone_number = request.phone_number
+        await db.flush()
+        await db.refresh(user)
+        return user
+    
     try:
-        # Update phone number
-        current_user.phone_number = request.phone_number
+        user = await run_unit_of_work(update_phone)
+        await cache_sync.user_changed(user.id)
         
-        db.add(current_user)
-        await db.commit()
-        await db.refresh(current_user)
-        
-        logger.info(f"Profile updated for user {current_user.student_id}")
+        logger.info(f"Profile updated for user {user.student_id}")
         
         return UpdateProfileResponse(
             success=True,
             message="Profile updated successfully",
-            user=UserResponse.model_validate(current_user)
+            user=UserResponse.model_validate(user)
         )
     
     except Exception as e:
         logger.error(f"Error updating profile: {e}")
-        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update profile"
@@ -112,32 +80,78 @@ async def update_profile(
 
 # ============ Activity Endpoints ============
 
+def encode_cursor(item) -> str:
+    """Opaque cursor pointing just past an activity (or notification) in feed order"""
+    raw = f"{item.created_at.isoformat()}|{item.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, activity_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(activity_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def activity_page(
+    db: AsyncSession,
+    user_id: Optional[int],
+    limit: int,
+    offset: int,
+    cursor: Optional[str],
+    include_archived: bool = False
+) -> ActivityFeedResponse:
+    """One page of the (optionally per-user) feed, newest first"""
+    count_query = select(func.count(Activity.id))
+    query = select(Activity)
+    if user_id is not None:
+        count_query = count_query.where(Activity.user_id == user_id)
+        query = query.where(Activity.user_id == user_id)
+    
+    # Keyset pagination: seek past the cursor instead of scanning OFFSET rows
+    before = decode_cursor(cursor) if cursor else None
+    if before:
+        created_at, activity_id = before
+        query = query.where(
+            tuple_(Activity.created_at, Activity.id)
+            < tuple_(literal(created_at, Activity.created_at.type), activity_id)
+        )
+    elif offset:
+        query = query.offset(offset)
+    
+    total = (await db.execute(count_query)).scalar() or 0
+    result = await db.execute(
+        query.order_by(desc(Activity.created_at), desc(Activity.id)).limit(limit)
+    )
+    activities = [ActivityResponse.model_validate(a) for a in result.scalars().all()]
+    
+    # Archived history is older than anything in the table, so continue there
+    if include_archived and user_id is not None:
+        total += activity_archive.archived_count(user_id)
+        if len(activities) < limit and (offset == 0 or cursor):
+            if activities:
+                before = (activities[-1].created_at, activities[-1].id)
+            archived = await activity_archive.read_user_activities(user_id, before, limit - len(activities))
+            activities += [ActivityResponse.model_validate(a) for a in archived]
+    
+    return ActivityFeedResponse(
+        activities=activities,
+        total=total,
+        next_cursor=encode_cursor(activities[-1]) if len(activities) == limit else None
+    )
+
 @activities_router.get("/", response_model=ActivityFeedResponse)
 async def get_activities(
-    db: AsyncSession = Depends(get_db_session),
-    limit: int = 50,
-    offset: int = 0
+    db: AsyncSession = Depends(get_read_session),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None
 ):
     """Get activity feed"""
     try:
-        # Get total count
-        result = await db.execute(select(Activity))
-        total = len(result.scalars().all())
-        
-        # Get paginated activities
-        result = await db.execute(
-            select(Activity)
-            .order_by(desc(Activity.created_at))
-            .offset(offset)
-            .limit(limit)
-        )
-        activities = result.scalars().all()
-        
-        return ActivityFeedResponse(
-            activities=[ActivityResponse.model_validate(a) for a in activities],
-            total=total
-        )
+        return await activity_page(db, None, limit, offset, cursor)
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting activities: {e}")
         raise HTTPException(
@@ -148,33 +162,18 @@ async def get_activities(
 @activities_router.get("/user/{user_id}", response_model=ActivityFeedResponse)
 async def get_user_activities(
     user_id: int,
-    db: AsyncSession = Depends(get_db_session),
-    limit: int = 50,
-    offset: int = 0
+    db: AsyncSession = Depends(get_read_session),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    include_archived: bool = False
 ):
-    """Get activities for specific user"""
+    """Get activities for specific user (include_archived pages into archived history)"""
     try:
-        # Get total count
-        result = await db.execute(
-            select(Activity).where(Activity.user_id == user_id)
-        )
-        total = len(result.scalars().all())
-        
-        # Get paginated activities
-        result = await db.execute(
-            select(Activity)
-            .where(Activity.user_id == user_id)
-            .order_by(desc(Activity.created_at))
-            .offset(offset)
-            .limit(limit)
-        )
-        activities = result.scalars().all()
-        
-        return ActivityFeedResponse(
-            activities=[ActivityResponse.model_validate(a) for a in activities],
-            total=total
-        )
+        return await activity_page(db, user_id, limit, offset, cursor, include_archived)
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting user activities: {e}")
         raise HTTPException(
@@ -186,26 +185,37 @@ async def get_user_activities(
 
 @notifications_router.get("/", response_model=NotificationsResponse)
 async def get_notifications(
-    db: AsyncSession = Depends(get_db_session),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_session),
+    current_user: User = Depends(get_current_user),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    is_read: Optional[bool] = None
 ):
-    """Get user notifications"""
+    """Get user notifications, newest first (is_read filters read or unread)"""
     try:
+        query = select(Notification).where(Notification.user_id == current_user.id)
+        if is_read is not None:
+            query = query.where(Notification.is_read == is_read)
+        if cursor:
+            created_at, notification_id = decode_cursor(cursor)
+            query = query.where(
+                tuple_(Notification.created_at, Notification.id)
+                < tuple_(literal(created_at, Notification.created_at.type), notification_id)
+            )
+        
         result = await db.execute(
-            select(Notification)
-            .where(Notification.user_id == current_user.id)
-            .order_by(desc(Notification.created_at))
+            query.order_by(desc(Notification.created_at), desc(Notification.id)).limit(limit)
         )
-        notifications = result.scalars().all()
-        
-        # Count unread
-        unread_count = sum(1 for n in notifications if not n.is_read)
+        notifications = [NotificationResponse.model_validate(n) for n in result.scalars().all()]
         
         return NotificationsResponse(
-            notifications=[NotificationResponse.model_validate(n) for n in notifications],
-            unread_count=unread_count
+            notifications=notifications,
+            unread_count=await count_unread(db, current_user.id),
+            next_cursor=encode_cursor(notifications[-1]) if len(notifications) == limit else None
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting notifications: {e}")
         raise HTTPException(
@@ -213,14 +223,96 @@ async def get_notifications(
             detail="Failed to get notifications"
         )
 
+def bulk_filters(user_id: int, request: BulkNotificationRequest) -> list:
+    """WHERE terms for a bulk request, always scoped to the user's own notifications"""
+    filters = [Notification.user_id == user_id]
+    if request.ids is not None:
+        filters.append(Notification.id.in_(request.ids))
+    if request.before:
+        created_at, notification_id = decode_cursor(request.before)
+        filters.append(
+            tuple_(Notification.created_at, Notification.id)
+            < tuple_(literal(created_at, Notification.created_at.type), notification_id)
+        )
+    if request.notification_type is not None:
+        filters.append(Notification.notification_type == NotificationType(request.notification_type.value))
+    if len(filters) == 1 and not request.all:
+        raise HTTPException(status_code=400, detail="Specify ids, before, notification_type or all")
+    return filters
+
+@notifications_router.put("/read", response_model=BulkNotificationResponse)
+async def mark_many_as_read(
+    request: BulkNotificationRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Mark the selected notifications as read in one UPDATE"""
+    filters = bulk_filters(current_user.id, request)
+    
+    async def mark_read(db: AsyncSession) -> Tuple[int, int]:
+        result = await db.execute(
+            update(Notification)
+            .where(*filters, Notification.is_read == False)
+            .values(is_read=True)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount, await count_unread(db, current_user.id)
+    
+    try:
+        affected, unread_count = await run_unit_of_work(mark_read)
+        if affected:
+            await manager.broadcast_unread_count(current_user.id, unread_count)
+        return BulkNotificationResponse(success=True, affected=affected, unread_count=unread_count)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error marking notifications as read: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to mark as read"
+        )
+
+@notifications_router.post("/delete", response_model=BulkNotificationResponse)
+async def delete_many(
+    request: BulkNotificationRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Delete the selected notifications in one DELETE"""
+    filters = bulk_filters(current_user.id, request)
+    
+    async def delete_selected(db: AsyncSession) -> Tuple[int, int, int]:
+        result = await db.execute(
+            delete(Notification)
+            .where(*filters)
+            .returning(Notification.is_read)
+            .execution_options(synchronize_session=False)
+        )
+        deleted = result.scalars().all()
+        unread_deleted = sum(1 for is_read in deleted if not is_read)
+        return len(deleted), unread_deleted, await count_unread(db, current_user.id)
+    
+    try:
+        affected, unread_deleted, unread_count = await run_unit_of_work(delete_selected)
+        if unread_deleted:
+            await manager.broadcast_unread_count(current_user.id, unread_count)
+        return BulkNotificationResponse(success=True, affected=affected, unread_count=unread_count)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting notifications: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to delete notifications"
+        )
+
 @notifications_router.put("/{notification_id}/read")
 async def mark_as_read(
     notification_id: int,
-    db: AsyncSession = Depends(get_db_session),
     current_user: User = Depends(get_current_user)
 ):
     """Mark notification as read"""
-    try:
+    async def mark_read(db: AsyncSession) -> Optional[int]:
         result = await db.execute(
             select(Notification).where(
                 Notification.id == notification_id,
@@ -232,17 +324,22 @@ async def mark_as_read(
         if not notification:
             raise HTTPException(status_code=404, detail="Notification not found")
         
+        if notification.is_read:
+            return None
         notification.is_read = True
-        db.add(notification)
-        await db.commit()
-        
+        await db.flush()
+        return await count_unread(db, current_user.id)
+    
+    try:
+        unread_count = await run_unit_of_work(mark_read)
+        if unread_count is not None:
+            await manager.broadcast_unread_count(current_user.id, unread_count)
         return {"success": True, "message": "Marked as read"}
     
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error marking notification as read: {e}")
-        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to mark as read"
@@ -251,11 +348,10 @@ async def mark_as_read(
 @notifications_router.delete("/{notification_id}")
 async def delete_notification(
     notification_id: int,
-    db: AsyncSession = Depends(get_db_session),
     current_user: User = Depends(get_current_user)
 ):
     """Delete a notification"""
-    try:
+    async def delete_one(db: AsyncSession) -> Optional[int]:
         result = await db.execute(
             select(Notification).where(
                 Notification.id == notification_id,
@@ -267,16 +363,23 @@ async def delete_notification(
         if not notification:
             raise HTTPException(status_code=404, detail="Notification not found")
         
+        was_unread = not notification.is_read
         await db.delete(notification)
-        await db.commit()
-        
+        if not was_unread:
+            return None
+        await db.flush()
+        return await count_unread(db, current_user.id)
+    
+    try:
+        unread_count = await run_unit_of_work(delete_one)
+        if unread_count is not None:
+            await manager.broadcast_unread_count(current_user.id, unread_count)
         return {"success": True, "message": "Notification deleted"}
     
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error deleting notification: {e}")
-        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete notification"
@@ -1,53 +1,79 @@
 """
 Authentication Routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy import select
-from datetime import datetime, timedelta
-from app.database import get_db_session
+from typing import Optional
+from app.database import ReplicaSessionLocal, read_router
+from app.write_queue import run_unit_of_work
 from app.models import User
 from app.schemas import (
     UserRegisterRequest, UserLoginRequest, TokenResponse, 
     UserResponse, RefreshTokenRequest
 )
-from app.security import hash_password, verify_password, create_access_token, create_refresh_token, verify_token
+from app.security import create_access_token, create_refresh_token, verify_token
+from app.hashing import hash_executor, HashingBackpressureError
 from config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1/auth", tags=["auth"])
 
+def hashing_unavailable() -> HTTPException:
+    """503 returned when the hashing pool is saturated"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy, please try again shortly",
+        headers={"Retry-After": str(settings.HASH_BACKPRESSURE_RETRY_AFTER)}
+    )
+
+async def find_user(student_id: Optional[str] = None, user_id: Optional[int] = None) -> Optional[User]:
+    """Look a user up on a short-lived read session"""
+    # Closed before any hashing: a session held across bcrypt would pin a
+    # connection, and on SQLite a write session holds the one writer lock
+    async with ReplicaSessionLocal() as db:
+        if user_id is not None:
+            db.info["user_id"] = user_id  # sticky after a write, e.g. register then refresh
+            query = select(User).where(User.id == user_id)
+        else:
+            query = select(User).where(User.student_id == student_id)
+        result = await db.execute(query)
+        return result.scalar_one_or_none()
+
 @router.post("/register", response_model=TokenResponse)
-async def register(
-    request: UserRegisterRequest,
-    db: AsyncSession = Depends(get_db_session)
-):
+async def register(request: UserRegisterRequest):
     """Register a new user"""
+    already_registered = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Student ID already registered"
+    )
     try:
         # Check if user already exists
-        result = await db.execute(
-            select(User).where(User.student_id == request.student_id)
-        )
-        existing_user = result.scalar_one_or_none()
-        
-        if existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Student ID already registered"
-            )
+        if await find_user(student_id=request.student_id):
+            raise already_registered
         
-        # Create new user
-        hashed_pin = hash_password(request.pin)
-        new_user = User(
-            student_id=request.student_id,
-            pin_hash=hashed_pin,
-            phone_number=request.phone_number
-        )
+        # Hash outside any transaction, then insert in a short one
+        hashed_pin = await hash_executor.hash_password(request.pin)
         
-        db.add(new_user)
-        await db.commit()
-        await db.refresh(new_user)
+        async def create_user(db: AsyncSession) -> User:
+            new_user = User(
+                student_id=request.student_id,
+                pin_hash=hashed_pin,
+                phone_number=request.phone_number
+            )
+            db.add(new_user)
+            await db.flush()
+            await db.refresh(new_user)
+            return new_user
+        
+        try:
+            new_user = await run_unit_of_work(create_user)
+        except IntegrityError:
+            # Registered concurrently (or not yet visible on the replica)
+            raise already_registered
+        read_router.mark_write(new_user.id)  # the replica may not have the new user yet
         
         logger.info(f"User registered: {request.student_id}")
         
@@ -69,6 +95,9 @@ async def register(
     
     except HTTPException:
         raise
+    except HashingBackpressureError:
+        logger.warning("Registration rejected: hashing queue full")
+        raise hashing_unavailable()
     except Exception as e:
         logger.error(f"Registration error: {e}")
         raise HTTPException(
@@ -77,17 +106,11 @@ async def register(
         )
 
 @router.post("/login", response_model=TokenResponse)
-async def login(
-    request: UserLoginRequest,
-    db: AsyncSession = Depends(get_db_session)
-):
+async def login(request: UserLoginRequest):
     """Login user"""
     try:
         # Find user
-        result = await db.execute(
-            select(User).where(User.student_id == request.student_id)
-        )
-        user = result.scalar_one_or_none()
+        user = await find_user(student_id=request.student_id)
         
         if not user:
             raise HTTPException(
@@ -96,7 +119,7 @@ async def login(
             )
         
         # Verify PIN
-        if not verify_password(request.pin, user.pin_hash):
+        if not await hash_executor.verify_password(request.pin, user.pin_hash):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid credentials"
@@ -122,6 +145,9 @@ async def login(
     
     except HTTPException:
         raise
+    except HashingBackpressureError:
+        logger.warning("Login rejected: hashing queue full")
+        raise hashing_unavailable()
     except Exception as e:
         logger.error(f"Login error: {e}")
         raise HTTPException(
@@ -130,10 +156,7 @@ async def login(
         )
 
 @router.post("/refresh", response_model=TokenResponse)
-async def refresh_token(
-    request: RefreshTokenRequest,
-    db: AsyncSession = Depends(get_db_session)
-):
+async def refresh_token(request: RefreshTokenRequest):
     """Refresh access token"""
     try:
         # Verify refresh token
@@ -147,10 +170,7 @@ async def refresh_token(
             )
         
         # Get user
-        result = await db.execute(
-            select(User).where(User.id == int(user_id))
-        )
-        user = result.scalar_one_or_none()
+        user = await find_user(user_id=int(user_id))
         
         if not user:
             raise HTTPException(
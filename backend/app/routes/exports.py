@@ -0,0 +1,229 @@
+"""
+Streaming Export Routes
+
+Activity and fault report history as NDJSON or CSV. Rows are read with a
+server-side cursor and written to the response in small chunks, so memory
+stays flat however many rows match. The response body streams after the
+route has returned, so the generators open their own session instead of
+using a request-scoped one.
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, and_
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+import csv
+import io
+import json
+import logging
+
+from app.database import ReplicaSessionLocal
+from app.models import Activity, FaultReport, Machine, User
+from app.auth import get_current_user
+from app.archive import activity_archive, activity_record, naive_utc
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/api/v1/exports", tags=["exports"])
+
+EXPORT_CHUNK_ROWS = 500  # rows fetched per round trip and written per chunk
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+ACTIVITY_COLUMNS = ["id", "user_id", "activity_type", "machine_type", "machine_id", "details", "created_at"]
+FAULT_COLUMNS = ["id", "machine_type", "machine_id", "user_id", "description", "has_photo", "created_at"]
+
+# ============ Streaming helpers ============
+
+def encode_rows(rows: List[dict], export_format: str, columns: List[str]) -> str:
+    if export_format == "csv":
+        buffer = io.StringIO()
+        csv.DictWriter(buffer, fieldnames=columns).writerows(rows)
+        return buffer.getvalue()
+    return "".join(json.dumps(row) + "\n" for row in rows)
+
+async def stream_rows(records: AsyncIterator[dict], export_format: str, columns: List[str]):
+    """Encode records chunk by chunk; CSV gets a header row first"""
+    if export_format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(columns)
+        yield buffer.getvalue()
+
+    chunk = []
+    try:
+        async for record in records:
+            chunk.append(record)
+            if len(chunk) >= EXPORT_CHUNK_ROWS:
+                yield encode_rows(chunk, export_format, columns)
+                chunk = []
+        if chunk:
+            yield encode_rows(chunk, export_format, columns)
+    except Exception as e:
+        # Headers are already sent; the client sees a truncated body
+        logger.error(f"Export failed mid-stream: {e}")
+        raise
+
+def export_response(records: AsyncIterator[dict], export_format: str, columns: List[str], name: str):
+    filename = f"{name}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.{export_format}"
+    return StreamingResponse(
+        stream_rows(records, export_format, columns),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+def validate_filters(export_format: str, machine_type: Optional[str]):
+    if export_format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid format, use ndjson or csv")
+    if machine_type is not None and machine_type.lower() not in ["washer", "dryer"]:
+        raise HTTPException(status_code=400, detail="Invalid machine type")
+
+# ============ Record sources ============
+
+def archived_record_matches(
+    record: dict,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    user_id: Optional[int],
+    machine_type: Optional[str],
+    machine_id: Optional[int]
+) -> bool:
+    created_at = datetime.fromisoformat(record["created_at"])
+    return (
+        (start is None or created_at >= start)
+        and (end is None or created_at < end)
+        and (user_id is None or record["user_id"] == user_id)
+        and (machine_type is None or record["machine_type"] == machine_type)
+        and (machine_id is None or record["machine_id"] == machine_id)
+    )
+
+async def activity_records(
+    start: Optional[datetime],
+    end: Optional[datetime],
+    user_id: Optional[int],
+    machine_type: Optional[str],
+    machine_id: Optional[int],
+    include_archived: bool
+) -> AsyncIterator[dict]:
+    """Matching activities, oldest first: archived days, then the table"""
+    if include_archived:
+        # Archived days are older than every row still in the table
+        for day in activity_archive.archived_days(user_id):
+            if (start is not None and day < start.date().isoformat()) or (end is not None and day > end.date().isoformat()):
+                continue
+            async for record in activity_archive.stream_day(day):
+                if archived_record_matches(record, start, end, user_id, machine_type, machine_id):
+                    yield record
+
+    filters = []
+    if start is not None:
+        filters.append(Activity.created_at >= start)
+    if end is not None:
+        filters.append(Activity.created_at < end)
+    if user_id is not None:
+        filters.append(Activity.user_id == user_id)
+    if machine_type is not None:
+        filters.append(Activity.machine_type == machine_type)
+    if machine_id is not None:
+        filters.append(Activity.machine_id == machine_id)
+
+    async with ReplicaSessionLocal() as db:
+        result = await db.stream_scalars(
+            select(Activity)
+            .where(and_(True, *filters))
+            .order_by(Activity.created_at, Activity.id)
+            .execution_options(yield_per=EXPORT_CHUNK_ROWS)
+        )
+        async for activity in result:
+            yield activity_record(activity)
+
+async def fault_records(
+    start: Optional[datetime],
+    end: Optional[datetime],
+    user_id: Optional[int],
+    machine_type: Optional[str],
+    machine_id: Optional[int]
+) -> AsyncIterator[dict]:
+    """Matching fault reports, oldest first (photos are left out)"""
+    filters = []
+    if start is not None:
+        filters.append(FaultReport.created_at >= start)
+    if end is not None:
+        filters.append(FaultReport.created_at < end)
+    if user_id is not None:
+        filters.append(FaultReport.user_id == user_id)
+    if machine_type is not None:
+        filters.append(Machine.machine_type == machine_type)
+    if machine_id is not None:
+        filters.append(Machine.machine_id == machine_id)
+
+    async with ReplicaSessionLocal() as db:
+        result = await db.stream(
+            select(
+                FaultReport.id,
+                Machine.machine_type,
+                Machine.machine_id,
+                FaultReport.user_id,
+                FaultReport.description,
+                FaultReport.photo_data.is_not(None).label("has_photo"),
+                FaultReport.created_at,
+            )
+            .join(Machine, FaultReport.machine_id == Machine.id)
+            .where(and_(True, *filters))
+            .order_by(FaultReport.created_at, FaultReport.id)
+            .execution_options(yield_per=EXPORT_CHUNK_ROWS)
+        )
+        async for row in result:
+            yield {
+                "id": row.id,
+                "machine_type": row.machine_type.value,
+                "machine_id": row.machine_id,
+                "user_id": row.user_id,
+                "description": row.description,
+                "has_photo": bool(row.has_photo),
+                "created_at": naive_utc(row.created_at).isoformat(),
+            }
+
+# ============ Endpoints ============
+
+@router.get("/activities")
+async def export_activities(
+    format: str = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    user_id: Optional[int] = None,
+    machine_type: Optional[str] = None,
+    machine_id: Optional[int] = None,
+    include_archived: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """Stream activities as NDJSON or CSV, filtered by date range [start, end), user and machine"""
+    validate_filters(format, machine_type)
+    start = naive_utc(start) if start else None
+    end = naive_utc(end) if end else None
+    machine_type = machine_type.lower() if machine_type else None
+
+    logger.info(f"Activity export ({format}) requested by user {current_user.student_id}")
+    records = activity_records(start, end, user_id, machine_type, machine_id, include_archived)
+    return export_response(records, format, ACTIVITY_COLUMNS, "activities")
+
+@router.get("/faults")
+async def export_faults(
+    format: str = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    user_id: Optional[int] = None,
+    machine_type: Optional[str] = None,
+    machine_id: Optional[int] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Stream fault reports as NDJSON or CSV, filtered by date range [start, end), user and machine"""
+    validate_filters(format, machine_type)
+    start = naive_utc(start) if start else None
+    end = naive_utc(end) if end else None
+    machine_type = machine_type.lower() if machine_type else None
+
+    logger.info(f"Fault report export ({format}) requested by user {current_user.student_id}")
+    records = fault_records(start, end, user_id, machine_type, machine_id)
+    return export_response(records, format, FAULT_COLUMNS, "fault-reports")
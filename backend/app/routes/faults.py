@@ -1,71 +1,33 @@
 """
 Fault Reporting Routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Header
+from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, func
-from app.database import get_db_session
+from app.database import get_read_session
 from app.models import FaultReport, Machine, User, MachineStatus, Activity, ActivityType, MachineType
 from app.schemas import ReportFaultRequest, FaultReportResponse, MachineReportCountResponse
-from app.security import verify_token
+from app.auth import get_current_user
 from app.websocket_manager import manager
+from app import cache_sync
+from app.cycle_timer import cycle_timer
+from app.write_queue import run_unit_of_work
+from app.activity_log import activity_log
 from config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1/faults", tags=["faults"])
 
-# ============ Dependency for current user ============
-
-async def get_current_user(
-    authorization: str = Header(None),
-    db: AsyncSession = Depends(get_db_session)
-):
-    """Get current user from JWT token"""
-    if not authorization:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authenticated"
-        )
-    
-    try:
-        scheme, token = authorization.split()
-        if scheme.lower() != "bearer":
-            raise ValueError("Invalid scheme")
-        
-        payload = verify_token(token)
-        user_id = payload.get("sub")
-        
-        if not user_id:
-            raise ValueError("Invalid token")
-        
-        result = await db.execute(
-            select(User).where(User.id == int(user_id))
-        )
-        user = result.scalar_one_or_none()
-        
-        if not user:
-            raise ValueError("User not found")
-        
-        return user
-    
-    except Exception as e:
-        logger.error(f"Auth error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials"
-        )
-
 # ============ Endpoints ============
 
 @router.post("/report", response_model=FaultReportResponse)
 async def report_fault(
     request: ReportFaultRequest,
-    db: AsyncSession = Depends(get_db_session),
     current_user: User = Depends(get_current_user)
 ):
     """Report a fault on a machine"""
-    try:
+    async def report(db: AsyncSession):
         # Get machine
         result = await db.execute(
             select(Machine).where(
@@ -106,7 +68,8 @@ async def report_fault(
             logger.warning(f"Machine {request.machine_type} {request.machine_id} disabled after {report_count} reports")
         
         # Log activity
-        activity = Activity(
+        activity = activity_log.record(
+            db,
             user_id=current_user.id,
             activity_type=ActivityType.FAULT_REPORTED,
             machine_type=request.machine_type,
@@ -114,9 +77,18 @@ async def report_fault(
             details=request.description
         )
         
-        db.add(activity)
-        await db.commit()
+        await db.flush()
         await db.refresh(fault_report)
+        if machine.status == MachineStatus.DISABLED:
+            await db.refresh(machine)
+        return fault_report, machine, report_count, activity
+    
+    try:
+        fault_report, machine, report_count, activity = await run_unit_of_work(report)
+        
+        if machine.status == MachineStatus.DISABLED:
+            await cache_sync.machine_changed(machine)
+            cycle_timer.cancel(machine.machine_type, machine.machine_id)
         
         logger.info(f"Fault reported for {request.machine_type} {request.machine_id} by user {current_user.student_id}")
         
@@ -128,6 +100,7 @@ async def report_fault(
             "is_disabled": machine.status == MachineStatus.DISABLED,
             "description": request.description
         })
+        await activity_log.publish(activity)
         
         return FaultReportResponse.model_validate(fault_report)
     
@@ -135,7 +108,6 @@ async def report_fault(
         raise
     except Exception as e:
         logger.error(f"Error reporting fault: {e}")
-        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to report fault"
@@ -145,7 +117,7 @@ async def report_fault(
 async def get_machine_report_count(
     machine_type: str,
     machine_id: int,
-    db: AsyncSession = Depends(get_db_session)
+    db: AsyncSession = Depends(get_read_session)
 ):
     """Get fault report count for a machine"""
     try:
@@ -192,7 +164,7 @@ async def get_machine_report_count(
 
 @router.get("/")
 async def get_all_reports(
-    db: AsyncSession = Depends(get_db_session),
+    db: AsyncSession = Depends(get_read_session),
     current_user: User = Depends(get_current_user)
 ):
     """Get all fault reports (admin only for now)"""
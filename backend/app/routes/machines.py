@@ -1,206 +1,137 @@
 """
 Machine Management Routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Header
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, desc
-from app.database import get_db_session
+from sqlalchemy import select, update, and_, desc
+from app.write_queue import run_unit_of_work
+from app.activity_log import activity_log
 from app.models import Machine, User, FaultReport, Activity, MachineType, MachineStatus, CycleCategory, ActivityType
 from app.schemas import (
     MachineResponse, MachineListResponse, StartMachineRequest, 
     StartMachineResponse, CancelMachineRequest, EndCycleRequest,
     MachineReportCountResponse
 )
-from app.security import verify_token
+from app.auth import get_current_user
 from app.websocket_manager import manager
+from app.machine_state import machine_store
+from app import cache_sync
+from app.cycle_timer import cycle_timer, as_utc
 from config import settings
 from app.security import get_cycle_time_seconds
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1/machines", tags=["machines"])
 
-# ============ Dependency for current user ============
+# ============ Transition helpers ============
 
-async def get_current_user(
-    authorization: str = Header(None),
-    db: AsyncSession = Depends(get_db_session)
-):
-    """Get current user from JWT token"""
-    if not authorization:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authenticated"
+def machine_filter(machine_type, machine_id: int):
+    """WHERE clause identifying one physical machine"""
+    return and_(
+        Machine.machine_type == machine_type,
+        Machine.machine_id == machine_id
+    )
+
+async def transition_error(
+    db: AsyncSession,
+    machine_type,
+    machine_id: int,
+    action: str,
+    user_id: Optional[int] = None
+) -> HTTPException:
+    """Explain why a conditional UPDATE matched no rows (cold path only)"""
+    result = await db.execute(
+        select(Machine.status, Machine.current_user_id).where(
+            machine_filter(machine_type, machine_id)
         )
+    )
+    row = result.one_or_none()
     
-    try:
-        scheme, token = authorization.split()
-        if scheme.lower() != "bearer":
-            raise ValueError("Invalid scheme")
-        
-        payload = verify_token(token)
-        user_id = payload.get("sub")
-        
-        if not user_id:
-            raise ValueError("Invalid token")
-        
-        # Get user from database
-        result = await db.execute(
-            select(User).where(User.id == int(user_id))
-        )
-        user = result.scalar_one_or_none()
-        
-        if not user:
-            raise ValueError("User not found")
-        
-        return user
+    if row is None:
+        return HTTPException(status_code=404, detail="Machine not found")
     
-    except Exception as e:
-        logger.error(f"Auth error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials"
+    if user_id is not None and row.status == MachineStatus.IN_USE and row.current_user_id != user_id:
+        return HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You are not using this machine"
         )
+    
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Cannot {action} machine in {row.status.value} state"
+    )
 
 # ============ Endpoints ============
 
 @router.get("/", response_model=MachineListResponse)
-async def get_machines(db: AsyncSession = Depends(get_db_session)):
+async def get_machines():
     """Get all machines organized by type"""
-    try:
-        # Get all machines
-        result = await db.execute(
-            select(Machine).order_by(Machine.machine_type, Machine.machine_id)
-        )
-        machines = result.scalars().all()
-        
-        # Separate by type
-        washers = [m for m in machines if m.machine_type == MachineType.WASHER]
-        dryers = [m for m in machines if m.machine_type == MachineType.DRYER]
-        
-        # Initialize missing machines (1-6 per type)
-        async def ensure_machines(machine_type: MachineType, existing: list):
-            for i in range(1, settings.MACHINES_PER_TYPE + 1):
-                if not any(m.machine_id == i for m in existing):
-                    new_machine = Machine(
-                        machine_id=i,
-                        machine_type=machine_type,
-                        status=MachineStatus.AVAILABLE
-                    )
-                    db.add(new_machine)
-                    existing.append(new_machine)
-            return existing
-        
-        washers = await ensure_machines(MachineType.WASHER, washers)
-        dryers = await ensure_machines(MachineType.DRYER, dryers)
-        
-        if washers or dryers:
-            await db.commit()
-        
-        # Convert to response
-        return MachineListResponse(
-            washers=[MachineResponse.model_validate(m) for m in washers],
-            dryers=[MachineResponse.model_validate(m) for m in dryers]
-        )
-    
-    except Exception as e:
-        logger.error(f"Error getting machines: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to get machines"
-        )
+    return Response(content=machine_store.list_json(), media_type="application/json")
 
 @router.get("/{machine_type}/{machine_id}", response_model=MachineResponse)
-async def get_machine(
-    machine_type: str,
-    machine_id: int,
-    db: AsyncSession = Depends(get_db_session)
-):
+async def get_machine(machine_type: str, machine_id: int):
     """Get specific machine"""
-    try:
-        if machine_type.lower() not in ["washer", "dryer"]:
-            raise HTTPException(status_code=400, detail="Invalid machine type")
-        
-        result = await db.execute(
-            select(Machine).where(
-                and_(
-                    Machine.machine_type == machine_type.lower(),
-                    Machine.machine_id == machine_id
-                )
-            )
-        )
-        machine = result.scalar_one_or_none()
-        
-        if not machine:
-            raise HTTPException(status_code=404, detail="Machine not found")
-        
-        return MachineResponse.model_validate(machine)
+    if machine_type.lower() not in ["washer", "dryer"]:
+        raise HTTPException(status_code=400, detail="Invalid machine type")
     
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error getting machine: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to get machine"
-        )
+    content = machine_store.machine_json(machine_type.lower(), machine_id)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Machine not found")
+    
+    return Response(content=content, media_type="application/json")
 
 @router.post("/start", response_model=StartMachineResponse)
 async def start_machine(
     request: StartMachineRequest,
-    db: AsyncSession = Depends(get_db_session),
     current_user: User = Depends(get_current_user)
 ):
     """Start a machine"""
-    try:
-        # Get machine
+    cycle_time = get_cycle_time_seconds(request.category)
+    
+    async def start(db: AsyncSession) -> Tuple[Machine, dict]:
+        # Compare-and-set: only an available, enabled machine can be started
         result = await db.execute(
-            select(Machine).where(
+            update(Machine)
+            .where(
                 and_(
-                    Machine.machine_type == request.machine_type,
-                    Machine.machine_id == request.machine_id
+                    machine_filter(request.machine_type, request.machine_id),
+                    Machine.status == MachineStatus.AVAILABLE,
+                    Machine.enabled == True
                 )
             )
+            .values(
+                status=MachineStatus.IN_USE,
+                current_category=request.category,
+                time_left_seconds=cycle_time,
+                ends_at=datetime.now(timezone.utc) + timedelta(seconds=cycle_time),
+                current_user_id=current_user.id,
+                total_cycles=Machine.total_cycles + 1
+            )
+            .returning(Machine)
         )
         machine = result.scalar_one_or_none()
         
         if not machine:
-            raise HTTPException(status_code=404, detail="Machine not found")
-        
-        if machine.status != MachineStatus.AVAILABLE:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Machine is {machine.status}"
-            )
-        
-        if not machine.enabled:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Machine is disabled"
-            )
-        
-        # Get cycle time
-        cycle_time = get_cycle_time_seconds(request.category)
-        
-        # Update machine
-        machine.status = MachineStatus.IN_USE
-        machine.current_category = request.category
-        machine.time_left_seconds = cycle_time
-        machine.current_user_id = current_user.id
-        machine.total_cycles += 1
+            raise await transition_error(db, request.machine_type, request.machine_id, "start")
         
         # Log activity
-        activity = Activity(
+        activity = activity_log.record(
+            db,
             user_id=current_user.id,
             activity_type=ActivityType.MACHINE_STARTED,
             machine_type=request.machine_type,
             machine_id=request.machine_id,
             details=f"Started cycle: {request.category}"
         )
-        
-        db.add(activity)
-        await db.commit()
-        await db.refresh(machine)
+        return machine, activity
+    
+    try:
+        machine, activity = await run_unit_of_work(start)
+        await cache_sync.machine_changed(machine)
+        cycle_timer.schedule(machine.machine_type, machine.machine_id, machine.ends_at)
         
         logger.info(f"Machine {request.machine_type} {request.machine_id} started by user {current_user.student_id}")
         
@@ -210,8 +141,10 @@ async def start_machine(
             "machine_type": machine.machine_type,
             "status": machine.status,
             "time_left_seconds": machine.time_left_seconds,
+            "ends_at": as_utc(machine.ends_at).isoformat(),
             "current_user_id": machine.current_user_id
         })
+        await activity_log.publish(activity)
         
         return StartMachineResponse(
             success=True,
@@ -224,7 +157,6 @@ async def start_machine(
         raise
     except Exception as e:
         logger.error(f"Error starting machine: {e}")
-        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to start machine"
@@ -233,52 +165,50 @@ async def start_machine(
 @router.post("/cancel")
 async def cancel_machine(
     request: CancelMachineRequest,
-    db: AsyncSession = Depends(get_db_session),
     current_user: User = Depends(get_current_user)
 ):
     """Cancel a machine"""
-    try:
+    async def cancel(db: AsyncSession) -> Tuple[Machine, dict]:
+        # Compare-and-set: only the user running the cycle can cancel it
         result = await db.execute(
-            select(Machine).where(
+            update(Machine)
+            .where(
                 and_(
-                    Machine.machine_type == request.machine_type,
-                    Machine.machine_id == request.machine_id
+                    machine_filter(request.machine_type, request.machine_id),
+                    Machine.status == MachineStatus.IN_USE,
+                    Machine.current_user_id == current_user.id
                 )
             )
+            .values(
+                status=MachineStatus.AVAILABLE,
+                current_category=None,
+                time_left_seconds=0,
+                ends_at=None,
+                current_user_id=None
+            )
+            .returning(Machine)
         )
         machine = result.scalar_one_or_none()
         
         if not machine:
-            raise HTTPException(status_code=404, detail="Machine not found")
-        
-        if machine.status != MachineStatus.IN_USE:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Cannot cancel machine in {machine.status} state"
+            raise await transition_error(
+                db, request.machine_type, request.machine_id, "cancel", user_id=current_user.id
             )
         
-        if machine.current_user_id != current_user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You are not using this machine"
-            )
-        
-        # Update machine
-        machine.status = MachineStatus.AVAILABLE
-        machine.current_category = None
-        machine.time_left_seconds = 0
-        machine.current_user_id = None
-        
         # Log activity
-        activity = Activity(
+        activity = activity_log.record(
+            db,
             user_id=current_user.id,
             activity_type=ActivityType.MACHINE_CANCELLED,
             machine_type=request.machine_type,
             machine_id=request.machine_id
         )
-        
-        db.add(activity)
-        await db.commit()
+        return machine, activity
+    
+    try:
+        machine, activity = await run_unit_of_work(cancel)
+        await cache_sync.machine_changed(machine)
+        cycle_timer.cancel(machine.machine_type, machine.machine_id)
         
         logger.info(f"Machine {request.machine_type} {request.machine_id} cancelled by user {current_user.student_id}")
         
@@ -288,8 +218,10 @@ async def cancel_machine(
             "machine_type": machine.machine_type,
             "status": machine.status,
             "time_left_seconds": 0,
+            "ends_at": None,
             "current_user_id": None
         })
+        await activity_log.publish(activity)
         
         return {
             "success": True,
@@ -300,7 +232,6 @@ async def cancel_machine(
         raise
     except Exception as e:
         logger.error(f"Error cancelling machine: {e}")
-        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to cancel machine"
@@ -309,44 +240,46 @@ async def cancel_machine(
 @router.post("/end")
 async def end_cycle(
     request: EndCycleRequest,
-    db: AsyncSession = Depends(get_db_session),
     current_user: User = Depends(get_current_user)
 ):
     """End a machine cycle"""
-    try:
+    async def end(db: AsyncSession) -> Tuple[Machine, dict]:
+        # Compare-and-set: only a running cycle can be ended
         result = await db.execute(
-            select(Machine).where(
+            update(Machine)
+            .where(
                 and_(
-                    Machine.machine_type == request.machine_type,
-                    Machine.machine_id == request.machine_id
+                    machine_filter(request.machine_type, request.machine_id),
+                    Machine.status == MachineStatus.IN_USE
                 )
             )
+            .values(
+                status=MachineStatus.COMPLETED,
+                time_left_seconds=0,
+                ends_at=None
+            )
+            .returning(Machine)
         )
         machine = result.scalar_one_or_none()
         
         if not machine:
-            raise HTTPException(status_code=404, detail="Machine not found")
-        
-        if machine.status != MachineStatus.IN_USE:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Cannot end cycle for machine in {machine.status} state"
-            )
-        
-        # Update machine
-        machine.status = MachineStatus.COMPLETED
+            raise await transition_error(db, request.machine_type, request.machine_id, "end cycle for")
         
         # Log activity
-        activity = Activity(
+        activity = activity_log.record(
+            db,
             user_id=current_user.id,
             activity_type=ActivityType.MACHINE_COMPLETED,
             machine_type=request.machine_type,
             machine_id=request.machine_id,
             details=f"Cycle completed: {machine.current_category}"
         )
-        
-        db.add(activity)
-        await db.commit()
+        return machine, activity
+    
+    try:
+        machine, activity = await run_unit_of_work(end)
+        await cache_sync.machine_changed(machine)
+        cycle_timer.cancel(machine.machine_type, machine.machine_id)
         
         logger.info(f"Machine {request.machine_type} {request.machine_id} cycle completed")
         
@@ -356,8 +289,10 @@ async def end_cycle(
             "machine_type": machine.machine_type,
             "status": machine.status,
             "time_left_seconds": 0,
+            "ends_at": None,
             "current_user_id": None
         })
+        await activity_log.publish(activity)
         
         return {
             "success": True,
@@ -368,7 +303,6 @@ async def end_cycle(
         raise
     except Exception as e:
         logger.error(f"Error ending cycle: {e}")
-        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to end cycle"
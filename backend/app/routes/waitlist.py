@@ -1,101 +1,34 @@
 """
 Waitlist Management Routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Header
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, desc, func
-from app.database import get_db_session
+from typing import Tuple
+from app.write_queue import run_unit_of_work
+from app.activity_log import activity_log
 from app.models import WaitlistItem, User, MachineType, Activity, ActivityType
-from app.schemas import (
-    WaitlistResponse, WaitlistItemResponse, JoinWaitlistRequest,
-    LeaveWaitlistRequest
-)
-from app.security import verify_token
+from app.schemas import WaitlistResponse, JoinWaitlistRequest, LeaveWaitlistRequest
+from app.auth import get_current_user
 from app.websocket_manager import manager
+from app.waitlist_state import waitlist_store
+from app import cache_sync
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1/waitlist", tags=["waitlist"])
 
-# ============ Dependency for current user ============
-
-async def get_current_user(
-    authorization: str = Header(None),
-    db: AsyncSession = Depends(get_db_session)
-):
-    """Get current user from JWT token"""
-    if not authorization:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authenticated"
-        )
-    
-    try:
-        scheme, token = authorization.split()
-        if scheme.lower() != "bearer":
-            raise ValueError("Invalid scheme")
-        
-        payload = verify_token(token)
-        user_id = payload.get("sub")
-        
-        if not user_id:
-            raise ValueError("Invalid token")
-        
-        result = await db.execute(
-            select(User).where(User.id == int(user_id))
-        )
-        user = result.scalar_one_or_none()
-        
-        if not user:
-            raise ValueError("User not found")
-        
-        return user
-    
-    except Exception as e:
-        logger.error(f"Auth error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials"
-        )
-
 # ============ Endpoints ============
 
 @router.get("/{machine_type}", response_model=WaitlistResponse)
-async def get_waitlist(
-    machine_type: str,
-    db: AsyncSession = Depends(get_db_session)
-):
-    """Get waitlist for a machine type"""
+async def get_waitlist(machine_type: str):
+    """Get waitlist for a machine type (served from the waitlist cache)"""
     try:
         if machine_type.lower() not in ["washer", "dryer"]:
             raise HTTPException(status_code=400, detail="Invalid machine type")
         
-        # Get waitlist items
-        result = await db.execute(
-            select(WaitlistItem, User).join(User).where(
-                WaitlistItem.machine_type == machine_type.lower()
-            ).order_by(WaitlistItem.position)
-        )
-        
-        items = result.all()
-        
-        waitlist_items = [
-            WaitlistItemResponse(
-                id=item[0].id,
-                user_id=item[1].id,
-                student_id=item[1].student_id,
-                machine_type=item[0].machine_type,
-                position=item[0].position,
-                joined_at=item[0].joined_at
-            )
-            for item in items
-        ]
-        
-        return WaitlistResponse(
-            machine_type=machine_type.lower(),
-            items=waitlist_items,
-            count=len(waitlist_items)
-        )
+        content = await waitlist_store.get_json(machine_type.lower())
+        return Response(content=content, media_type="application/json")
     
     except HTTPException:
         raise
@@ -109,13 +42,12 @@ async def get_waitlist(
 @router.post("/join", response_model=dict)
 async def join_waitlist(
     request: JoinWaitlistRequest,
-    db: AsyncSession = Depends(get_db_session),
     current_user: User = Depends(get_current_user)
 ):
     """Join waitlist for a machine type"""
-    try:
-        machine_type_str = request.machine_type.value if hasattr(request.machine_type, 'value') else str(request.machine_type)
-        
+    machine_type_str = request.machine_type.value if hasattr(request.machine_type, 'value') else str(request.machine_type)
+    
+    async def join(db: AsyncSession) -> Tuple[int, dict]:
         # Check if already on waitlist
         result = await db.execute(
             select(WaitlistItem).where(
@@ -148,17 +80,21 @@ async def join_waitlist(
             position=next_position
         )
         
+        db.add(waitlist_item)
+        
         # Log activity
-        activity = Activity(
+        activity = activity_log.record(
+            db,
             user_id=current_user.id,
             activity_type=ActivityType.JOINED_WAITLIST,
             machine_type=machine_type_str,
             details=f"Joined {machine_type_str} waitlist at position {next_position}"
         )
-        
-        db.add(waitlist_item)
-        db.add(activity)
-        await db.commit()
+        return next_position, activity
+    
+    try:
+        next_position, activity = await run_unit_of_work(join)
+        await cache_sync.waitlist_changed(machine_type_str)
         
         logger.info(f"User {current_user.student_id} joined {machine_type_str} waitlist at position {next_position}")
         
@@ -167,6 +103,7 @@ async def join_waitlist(
             machine_type_str,
             [{"position": next_position, "student_id": current_user.student_id}]
         )
+        await activity_log.publish(activity)
         
         return {
             "success": True,
@@ -178,7 +115,6 @@ async def join_waitlist(
         raise
     except Exception as e:
         logger.error(f"Error joining waitlist: {e}")
-        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to join waitlist"
@@ -187,13 +123,12 @@ async def join_waitlist(
 @router.post("/leave", response_model=dict)
 async def leave_waitlist(
     request: LeaveWaitlistRequest,
-    db: AsyncSession = Depends(get_db_session),
     current_user: User = Depends(get_current_user)
 ):
     """Leave waitlist for a machine type"""
-    try:
-        machine_type_str = request.machine_type.value if hasattr(request.machine_type, 'value') else str(request.machine_type)
-        
+    machine_type_str = request.machine_type.value if hasattr(request.machine_type, 'value') else str(request.machine_type)
+    
+    async def leave(db: AsyncSession):
         # Find and remove from waitlist
         result = await db.execute(
             select(WaitlistItem).where(
@@ -216,14 +151,16 @@ async def leave_waitlist(
         await db.delete(waitlist_item)
         
         # Log activity
-        activity = Activity(
+        return activity_log.record(
+            db,
             user_id=current_user.id,
             activity_type=ActivityType.LEFT_WAITLIST,
             machine_type=machine_type_str
         )
-        
-        db.add(activity)
-        await db.commit()
+    
+    try:
+        activity = await run_unit_of_work(leave)
+        await cache_sync.waitlist_changed(machine_type_str)
         
         logger.info(f"User {current_user.student_id} left {machine_type_str} waitlist")
         
@@ -232,6 +169,7 @@ async def leave_waitlist(
             machine_type_str,
             [{"removed_user_id": current_user.id}]
         )
+        await activity_log.publish(activity)
         
         return {
             "success": True,
@@ -242,7 +180,6 @@ async def leave_waitlist(
         raise
     except Exception as e:
         logger.error(f"Error leaving waitlist: {e}")
-        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to leave waitlist"
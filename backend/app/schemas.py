@@ -3,7 +3,7 @@ Pydantic Schemas for Request/Response Validation
 """
 from pydantic import BaseModel, Field, validator, EmailStr
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
 
 # Enums for validation
@@ -23,6 +23,14 @@ class CycleCategorySchema(str, Enum):
     EXTRA_10 = "extra_10"
     EXTRA_15 = "extra_15"
 
+class NotificationTypeSchema(str, Enum):
+    CYCLE_COMPLETE = "cycle_complete"
+    JOINED_WAITLIST = "joined_waitlist"
+    REMOVED_FROM_WAITLIST = "removed_from_waitlist"
+    MACHINE_AVAILABLE = "machine_available"
+    FAULT_REPORTED = "fault_reported"
+    SYSTEM_ALERT = "system_alert"
+
 # ============ Authentication Schemas ============
 
 class UserRegisterRequest(BaseModel):
@@ -70,12 +78,20 @@ class MachineResponse(BaseModel):
     status: MachineStatusSchema
     current_category: Optional[CycleCategorySchema]
     time_left_seconds: int
+    ends_at: Optional[datetime] = None
     current_user_id: Optional[int]
     enabled: bool
     total_cycles: int
     last_maintenance: Optional[datetime]
     created_at: datetime
-    updated_at: datetime
+    updated_at: Optional[datetime]
+    
+    @validator("ends_at")
+    def ends_at_utc(cls, v):
+        # SQLite returns naive datetimes; mark them as the UTC they are
+        if v is not None and v.tzinfo is None:
+            v = v.replace(tzinfo=timezone.utc)
+        return v
     
     class Config:
         from_attributes = True
@@ -169,6 +185,7 @@ class ActivityResponse(BaseModel):
 class ActivityFeedResponse(BaseModel):
     activities: List[ActivityResponse]
     total: int
+    next_cursor: Optional[str] = None  # pass as ?cursor= for the next page
 
 # ============ Notification Schemas ============
 
@@ -189,10 +206,23 @@ class NotificationResponse(BaseModel):
 class NotificationsResponse(BaseModel):
     notifications: List[NotificationResponse]
     unread_count: int
+    next_cursor: Optional[str] = None
 
 class MarkNotificationAsReadRequest(BaseModel):
     notification_id: int
 
+class BulkNotificationRequest(BaseModel):
+    """Selects notifications by ids, age and/or type (all must match), or all of them"""
+    ids: Optional[List[int]] = Field(None, min_length=1, max_length=500)
+    before: Optional[str] = None  # a next_cursor: only notifications after it in feed order
+    notification_type: Optional[NotificationTypeSchema] = None
+    all: bool = False
+
+class BulkNotificationResponse(BaseModel):
+    success: bool
+    affected: int
+    unread_count: int
+
 # ============ Profile Schemas ============
 
 class UpdateProfileRequest(BaseModel):
@@ -0,0 +1,49 @@
+"""
+WebSocket Connect Snapshot
+
+Builds the single frame pushed to a client right after the handshake so it
+does not have to fetch machines, both waitlists and notifications over REST.
+The frame is spliced together from the pre-serialized machine and waitlist
+caches; only the unread notification count touches the database.
+"""
+from sqlalchemy import select, func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import datetime
+import json
+
+from app.database import ReadSessionLocal
+from app.models import Notification
+from app.machine_state import machine_store
+from app.waitlist_state import waitlist_store, MACHINE_TYPES
+
+async def count_unread(db: AsyncSession, user_id: int) -> int:
+    """Unread notifications for a user, counted from the (user_id, is_read) index"""
+    result = await db.execute(
+        select(func.count()).select_from(Notification).where(
+            and_(Notification.user_id == user_id, Notification.is_read == False)
+        )
+    )
+    return result.scalar() or 0
+
+async def unread_notification_count(user_id: int) -> int:
+    """Number of unread notifications for a user"""
+    async with ReadSessionLocal() as db:
+        return await count_unread(db, user_id)
+
+async def build_snapshot(user_id: Optional[int]) -> str:
+    """Serialized snapshot frame: machines, waitlists and the unread count"""
+    waitlists = [
+        f'"{machine_type}": {(await waitlist_store.get_json(machine_type)).decode()}'
+        for machine_type in MACHINE_TYPES
+    ]
+    unread_count = await unread_notification_count(user_id) if user_id else None
+
+    # Machines last, so the frame carries their latest state
+    return (
+        '{"event": "snapshot", "data": {'
+        f'"machines": {machine_store.list_json().decode()}, '
+        f'"waitlists": {{{", ".join(waitlists)}}}, '
+        f'"unread_count": {json.dumps(unread_count)}'
+        f'}}, "timestamp": "{datetime.utcnow().isoformat()}"}}'
+    )
@@ -0,0 +1,84 @@
+"""
+Cached Waitlist Snapshots
+
+Waitlists change only when someone joins or leaves, but are read on every
+page load and WebSocket connect. Each machine type's waitlist is loaded once,
+kept as pre-serialized JSON and invalidated by the join/leave routes (in
+every worker, through app.cache_sync).
+"""
+from sqlalchemy import select
+from typing import Dict
+import json
+import logging
+
+from app.database import ReadSessionLocal
+from app.models import WaitlistItem, User
+from app.schemas import WaitlistResponse, WaitlistItemResponse
+
+logger = logging.getLogger(__name__)
+
+MACHINE_TYPES = ("washer", "dryer")
+
+class WaitlistStateStore:
+    """Pre-serialized waitlist per machine type, rebuilt only after a change"""
+
+    def __init__(self):
+        self._json: Dict[str, bytes] = {}
+        self._versions: Dict[str, int] = {machine_type: 0 for machine_type in MACHINE_TYPES}
+        self.loads = 0
+
+    def invalidate(self, machine_type: str):
+        """Drop the cached waitlist after a join or leave"""
+        self._json.pop(machine_type, None)
+        self._versions[machine_type] += 1
+
+    async def _load(self, machine_type: str) -> bytes:
+        async with ReadSessionLocal() as db:
+            result = await db.execute(
+                select(WaitlistItem, User).join(User).where(
+                    WaitlistItem.machine_type == machine_type
+                ).order_by(WaitlistItem.position)
+            )
+            items = result.all()
+
+        waitlist = WaitlistResponse(
+            machine_type=machine_type,
+            items=[
+                WaitlistItemResponse(
+                    id=item.id,
+                    user_id=user.id,
+                    student_id=user.student_id,
+                    machine_type=item.machine_type,
+                    position=item.position,
+                    joined_at=item.joined_at
+                )
+                for item, user in items
+            ],
+            count=len(items)
+        )
+        self.loads += 1
+        return json.dumps(waitlist.model_dump(mode="json")).encode()
+
+    async def get_json(self, machine_type: str) -> bytes:
+        """Serialized waitlist for one machine type"""
+        cached = self._json.get(machine_type)
+        if cached is not None:
+            return cached
+
+        version = self._versions[machine_type]
+        data = await self._load(machine_type)
+        # Don't cache a result that a join/leave made stale while loading
+        if self._versions[machine_type] == version:
+            self._json[machine_type] = data
+        return data
+
+    def invalidate_all(self):
+        """Drop every cached waitlist"""
+        for machine_type in MACHINE_TYPES:
+            self.invalidate(machine_type)
+
+    def get_metrics(self) -> dict:
+        return {"cached": sorted(self._json), "loads": self.loads}
+
+# Global waitlist state store instance
+waitlist_store = WaitlistStateStore()
@@ -2,89 +2,633 @@
 WebSocket Connection Manager for Real-time Updates
 """
 from fastapi import WebSocket
-from typing import Set, Dict, Optional
+from starlette.websockets import WebSocketState
+from typing import Any, Awaitable, Callable, Set, Dict, Optional, Deque, Iterable, List, Tuple, Union
+from collections import deque
+import asyncio
 import json
 import logging
+import time
+import uuid
 from datetime import datetime
+from config import settings
+from app.backplane import Backplane, InProcessBackplane, create_backplane, CACHE_TOPIC
+
+try:
+    import msgpack
+except ImportError:  # optional; clients that ask for it get JSON
+    msgpack = None
 
 logger = logging.getLogger(__name__)
 
+# Wire formats a client can pick with ?encoding= on the handshake
+ENCODINGS = ("json", "msgpack")
+
+# Close code for an invalid or expired token; unlike 1008, clients refresh and reconnect
+WS_CLOSE_AUTH_FAILED = 4001
+
+SnapshotProvider = Callable[[Optional[int]], Awaitable[str]]
+# Applies a cache invalidation (parsed CACHE_TOPIC frame) to this process
+CacheHandler = Callable[[dict], Awaitable[None]]
+
+# Topics every client may subscribe to; per-user events go to "user:<id>"
+PUBLIC_TOPICS = (
+    "machines:washer",
+    "machines:dryer",
+    "waitlist:washer",
+    "waitlist:dryer",
+    "activities",
+    "faults",
+)
+
+def user_topic(user_id: int) -> str:
+    """Topic carrying events for one user"""
+    return f"user:{user_id}"
+
+def _type_value(machine_type) -> str:
+    return str(getattr(machine_type, "value", machine_type))
+
+def _machine_key(machine_data: Dict[str, Any]) -> Tuple[str, Any]:
+    return (_type_value(machine_data.get("machine_type")), machine_data.get("machine_id"))
+
+class OutboundFrame:
+    """One outgoing event, serialized at most once per wire format
+
+    Built from the event dict, so JSON and MessagePack are each encoded
+    straight from it and shared by every client (and replay) that gets the
+    event. Frames that only exist as JSON text (the spliced snapshot) are
+    parsed once if a MessagePack client needs them.
+    """
+    __slots__ = ("message", "_text", "_packed")
+
+    def __init__(self, message: Optional[dict] = None, text: Optional[str] = None):
+        self.message = message
+        self._text = text
+        self._packed: Optional[bytes] = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = json.dumps(self.message)
+        return self._text
+
+    @property
+    def packed(self) -> bytes:
+        if self._packed is None:
+            message = self.message if self.message is not None else json.loads(self._text)
+            self._packed = msgpack.packb(message)
+        return self._packed
+
+    def encoded(self, encoding: str) -> Union[str, bytes]:
+        """The frame in a connection's wire format"""
+        return self.packed if encoding == "msgpack" else self.text
+
+class ClientConnection:
+    """An accepted WebSocket with its own bounded outbound queue and writer task"""
+
+    def __init__(self, websocket: WebSocket, user_id: Optional[int], max_queue: int, encoding: str = "json"):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.encoding = encoding
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.writer_task: Optional[asyncio.Task] = None
+        self.topics: Set[str] = set()
+        self.resync_pending = False  # a resync frame is queued but not yet sent
+        self.closing = False
+        self.connected_at = time.monotonic()
+        self.last_seen = self.connected_at  # last frame received from the client
+
 class ConnectionManager:
     """Manages WebSocket connections and broadcasts messages"""
-    
+
     def __init__(self):
-        self.active_connections: Set[WebSocket] = set()
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
         self.user_connections: Dict[int, Set[WebSocket]] = {}  # user_id -> websockets
-        
-    async def connect(self, websocket: WebSocket, user_id: Optional[int] = None):
-        """Register a new WebSocket connection"""
-        await websocket.accept()
-        self.active_connections.add(websocket)
-        
+        self.topic_subscribers: Dict[str, Set[WebSocket]] = {}  # topic -> websockets
+        self.backplane: Backplane = InProcessBackplane(self._deliver)
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+        # Builds the full-state frame sent on connect: async (user_id) -> str
+        self._snapshot: Optional[SnapshotProvider] = None
+        self._cache_handler: Optional[CacheHandler] = None
+
+        # Events held for the coalescing window, per topic in arrival order
+        self._pending: Dict[Optional[str], List[dict]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+        # Every delivered event gets the next sequence number. The epoch
+        # identifies this process so a client resuming against a different
+        # worker (or after a restart) is told to resync instead.
+        self.epoch = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self._replay: Deque[Tuple[int, Optional[str], OutboundFrame]] = deque(
+            maxlen=settings.WS_REPLAY_BUFFER_SIZE
+        )  # (seq, topic, frame)
+
+        # Metrics
+        self.frames_sent = 0
+        self.slow_consumer_resyncs = 0
+        self.slow_consumer_evictions = 0
+        self.idle_reaped = 0
+        self.rejected_at_capacity = 0
+        self.rejected_over_user_limit = 0
+        self.resumes = 0
+        self.resume_gaps = 0
+        self.snapshots_sent = 0
+        self.bytes_sent: Dict[str, int] = {encoding: 0 for encoding in ENCODINGS}
+        self.batches_sent = 0
+        self.events_batched = 0
+        self.events_superseded = 0
+        self._delivery_latencies: Deque[float] = deque(maxlen=2000)  # enqueue -> sent
+        self._fanout_latencies: Deque[float] = deque(maxlen=500)  # time to enqueue a broadcast
+
+    async def start(
+        self,
+        backplane: Optional[Backplane] = None,
+        snapshot: Optional[SnapshotProvider] = None,
+        cache_handler: Optional[CacheHandler] = None
+    ):
+        """Attach the event backplane, snapshot provider and cache handler and start the heartbeat"""
+        self._snapshot = snapshot
+        self._cache_handler = cache_handler
+        self.backplane = backplane or create_backplane(settings.WS_BACKPLANE_URL)
+        await self.backplane.start(self._deliver)
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def stop(self):
+        """Stop the heartbeat, flush held events and detach from the backplane"""
+        for task in (self._heartbeat_task, self._flush_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._heartbeat_task = None
+        self._flush_task = None
+        await self.flush()
+        await self.backplane.close()
+
+    def has_capacity(self) -> bool:
+        """Whether another connection may be registered"""
+        return len(self.active_connections) < settings.MAX_ACTIVE_CONNECTIONS
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        user_id: Optional[int] = None,
+        topics: Optional[Iterable[str]] = None,
+        encoding: str = "json"
+    ) -> bool:
+        """Register a WebSocket once its user (if any) is authenticated
+
+        Returns False if the connection was refused and closed. Clients that
+        do not name any topics are subscribed to every public topic; an
+        authenticated client is always subscribed to its own user topic.
+        Clients that ask for msgpack get binary frames when msgpack is
+        installed. The socket is accepted here unless the caller already
+        accepted it to read a token from the first frame.
+        """
+        if websocket in self.active_connections:
+            return True
+
+        if not self.has_capacity():
+            # The client backs off and retries
+            self.rejected_at_capacity += 1
+            logger.warning(f"WebSocket refused, at capacity ({len(self.active_connections)} connections)")
+            await self._refuse(websocket, 1013)
+            return False
+
+        if user_id and len(self.user_connections.get(user_id, ())) >= settings.MAX_CONNECTIONS_PER_USER:
+            self.rejected_over_user_limit += 1
+            logger.warning(f"WebSocket refused, user {user_id} already has the maximum connections")
+            await self._refuse(websocket, 1008)  # Policy violation; clients do not retry
+            return False
+
+        if encoding not in ENCODINGS or (encoding == "msgpack" and msgpack is None):
+            encoding = "json"
+
+        if websocket.client_state == WebSocketState.CONNECTING:
+            await websocket.accept()
+        conn = ClientConnection(websocket, user_id, settings.WS_SEND_QUEUE_SIZE, encoding)
+        conn.writer_task = asyncio.create_task(self._writer(conn))
+        self.active_connections[websocket] = conn
+        self.subscribe(websocket, PUBLIC_TOPICS if topics is None else topics)
+
         if user_id:
-            if user_id not in self.user_connections:
-                self.user_connections[user_id] = set()
-            self.user_connections[user_id].add(websocket)
-        
+            self.user_connections.setdefault(user_id, set()).add(websocket)
+            self.subscribe(websocket, [user_topic(user_id)])
+
         logger.info(f"WebSocket connected. Total connections: {len(self.active_connections)}")
-    
+        return True
+
     def disconnect(self, websocket: WebSocket, user_id: Optional[int] = None):
         """Unregister a WebSocket connection"""
-        self.active_connections.discard(websocket)
-        
+        conn = self.active_connections.pop(websocket, None)
+        if conn is None:
+            return
+
+        user_id = user_id or conn.user_id
         if user_id and user_id in self.user_connections:
             self.user_connections[user_id].discard(websocket)
             if not self.user_connections[user_id]:
                 del self.user_connections[user_id]
-        
+
+        for topic in conn.topics:
+            subscribers = self.topic_subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(websocket)
+                if not subscribers:
+                    del self.topic_subscribers[topic]
+
+        if conn.writer_task is not None and conn.writer_task is not asyncio.current_task():
+            conn.writer_task.cancel()
+
         logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
-    
-    async def broadcast(self, message: dict):
-        """Broadcast message to all connected clients"""
-        # Add timestamp to message
-        message["timestamp"] = datetime.utcnow().isoformat()
-        message_str = json.dumps(message)
-        
-        disconnected = set()
-        for connection in self.active_connections:
+
+    async def _refuse(self, websocket: WebSocket, code: int):
+        """Close with a code the client can see (a rejected handshake only shows 1006)"""
+        if websocket.client_state == WebSocketState.CONNECTING:
+            await websocket.accept()
+        await websocket.close(code=code)
+
+    def _allowed_topic(self, conn: ClientConnection, topic: str) -> bool:
+        if topic in PUBLIC_TOPICS:
+            return True
+        return conn.user_id is not None and topic == user_topic(conn.user_id)
+
+    def subscribe(self, websocket: WebSocket, topics: Iterable[str]) -> List[str]:
+        """Subscribe a connection to topics; returns the topics accepted"""
+        conn = self.active_connections.get(websocket)
+        if conn is None:
+            return []
+
+        accepted = []
+        for topic in topics:
+            if not self._allowed_topic(conn, topic):
+                continue
+            conn.topics.add(topic)
+            self.topic_subscribers.setdefault(topic, set()).add(websocket)
+            accepted.append(topic)
+        return accepted
+
+    def unsubscribe(self, websocket: WebSocket, topics: Iterable[str]) -> List[str]:
+        """Unsubscribe a connection from topics; returns the topics removed"""
+        conn = self.active_connections.get(websocket)
+        if conn is None:
+            return []
+
+        removed = []
+        for topic in topics:
+            if topic not in conn.topics:
+                continue
+            conn.topics.discard(topic)
+            subscribers = self.topic_subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(websocket)
+                if not subscribers:
+                    del self.topic_subscribers[topic]
+            removed.append(topic)
+        return removed
+
+    async def handle_client_message(self, websocket: WebSocket, data: dict):
+        """Handle a control message sent by a client"""
+        conn = self.active_connections.get(websocket)
+        if conn is not None:
+            conn.last_seen = time.monotonic()
+
+        action = data.get("action")
+        if action == "pong":
+            return
+        if action == "resume":
+            last_seq = data.get("last_seq")
+            if isinstance(last_seq, int):
+                await self.resume(websocket, last_seq, data.get("epoch"))
+            return
+        if action == "snapshot":
+            await self.send_snapshot(websocket)
+            return
+        topics = data.get("topics") or []
+        if not isinstance(topics, list):
+            return
+
+        if action == "subscribe":
+            changed = self.subscribe(websocket, topics)
+        elif action == "unsubscribe":
+            changed = self.unsubscribe(websocket, topics)
+        else:
+            return
+
+        if conn is not None:
+            self._fan_out([conn], OutboundFrame({
+                "event": f"{action}d",
+                "topics": changed,
+                "subscriptions": sorted(conn.topics),
+                "timestamp": datetime.utcnow().isoformat()
+            }))
+
+    async def _writer(self, conn: ClientConnection):
+        """Drain one connection's queue so a slow client only delays itself"""
+        try:
+            while True:
+                frame, enqueued_at, is_resync, _ = await conn.queue.get()
+                send = conn.websocket.send_bytes if isinstance(frame, bytes) else conn.websocket.send_text
+                await asyncio.wait_for(send(frame), timeout=settings.WS_SEND_TIMEOUT)
+                if is_resync:
+                    conn.resync_pending = False
+                self.frames_sent += 1
+                self.bytes_sent[conn.encoding] += len(frame)
+                self._delivery_latencies.append(time.perf_counter() - enqueued_at)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"WebSocket send timed out, evicting client (user {conn.user_id})")
+            self.slow_consumer_evictions += 1
+            self._evict(conn)
+        except Exception as e:
+            logger.error(f"Error sending message: {e}")
+            self.disconnect(conn.websocket)
+
+    def _evict(self, conn: ClientConnection, code: int = 1013):
+        """Drop a client that cannot keep up (1013: try again later)"""
+        if conn.closing:
+            return
+        conn.closing = True
+        self.disconnect(conn.websocket)
+        asyncio.create_task(self._close(conn.websocket, code))
+
+    async def _close(self, websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def _heartbeat(self):
+        """Ping every client on the configured interval and reap silent ones"""
+        while True:
+            await asyncio.sleep(settings.WEBSOCKET_HEARTBEAT_INTERVAL)
             try:
-                await connection.send_text(message_str)
+                self.reap_idle()
+                if self.active_connections:
+                    self._fan_out(list(self.active_connections.values()), OutboundFrame({
+                        "event": "ping",
+                        "timestamp": datetime.utcnow().isoformat()
+                    }))
             except Exception as e:
-                logger.error(f"Error sending message: {e}")
-                disconnected.add(connection)
-        
-        # Clean up disconnected connections
-        for conn in disconnected:
-            self.disconnect(conn)
-    
-    async def broadcast_to_user(self, user_id: int, message: dict):
-        """Broadcast message to specific user's connections"""
+                logger.error(f"WebSocket heartbeat error: {e}")
+
+    def reap_idle(self) -> int:
+        """Close connections that have not sent anything within the idle timeout"""
+        cutoff = time.monotonic() - settings.WEBSOCKET_IDLE_TIMEOUT
+        idle = [conn for conn in self.active_connections.values() if conn.last_seen < cutoff]
+        for conn in idle:
+            self.idle_reaped += 1
+            self._evict(conn, 1001)  # Going away
+        if idle:
+            logger.info(f"Reaped {len(idle)} idle WebSocket connections")
+        return len(idle)
+
+    def _enqueue(self, conn: ClientConnection, frame: OutboundFrame, enqueued_at: float, seq: Optional[int] = None):
+        """Queue a frame for one client, handling overflow per the slow-consumer policy"""
+        try:
+            conn.queue.put_nowait((frame.encoded(conn.encoding), enqueued_at, False, seq))
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if settings.WS_SLOW_CONSUMER_POLICY == "resync" and not conn.resync_pending:
+            # Replace the backlog with a single resync instruction
+            while not conn.queue.empty():
+                conn.queue.get_nowait()
+            conn.resync_pending = True
+            self.slow_consumer_resyncs += 1
+            resync = OutboundFrame({
+                "event": "resync_required",
+                "timestamp": datetime.utcnow().isoformat()
+            })
+            conn.queue.put_nowait((resync.encoded(conn.encoding), enqueued_at, True, None))
+            logger.warning(f"WebSocket client fell behind, asked to resync (user {conn.user_id})")
+        else:
+            self.slow_consumer_evictions += 1
+            logger.warning(f"WebSocket client fell behind, evicting (user {conn.user_id})")
+            self._evict(conn)
+
+    def _fan_out(self, connections, frame: OutboundFrame, seq: Optional[int] = None):
+        """Enqueue one frame on each connection, encoded once per wire format"""
+        started = time.perf_counter()
+        for conn in connections:
+            self._enqueue(conn, frame, started, seq)
+        self._fanout_latencies.append(time.perf_counter() - started)
+
+    def _missed(self, conn: ClientConnection, last_seq: int) -> List[Tuple[int, OutboundFrame]]:
+        """Buffered events after last_seq on the connection's topics"""
+        return [
+            (seq, frame)
+            for seq, topic, frame in self._replay
+            if seq > last_seq and (topic is None or topic in conn.topics)
+        ]
+
+    def _requeue(self, conn: ClientConnection, head: OutboundFrame, missed: List[Tuple[int, OutboundFrame]]) -> bool:
+        """Queue head followed by the missed events, in order
+
+        Live events may already be queued for this connection; they are
+        dropped here because they are also in the replay buffer, so nothing
+        arrives twice or out of order. Returns False, leaving the queue
+        untouched, if the replay would not fit in the send queue.
+        """
+        pending = []
+        while not conn.queue.empty():
+            pending.append(conn.queue.get_nowait())
+        kept = [item for item in pending if item[3] is None]
+        if conn.queue.maxsize > 0 and len(kept) + 1 + len(missed) > conn.queue.maxsize:
+            for item in pending:
+                conn.queue.put_nowait(item)
+            return False
+        for item in kept:
+            conn.queue.put_nowait(item)
+
+        started = time.perf_counter()
+        self._enqueue(conn, head, started)
+        for seq, frame in missed:
+            self._enqueue(conn, frame, started, seq)
+        return True
+
+    async def resume(self, websocket: WebSocket, last_seq: int, epoch: Optional[str]):
+        """Replay the events a reconnecting client missed after last_seq
+
+        If the client's epoch is from another process, events after
+        last_seq have already left the replay buffer, or there are more of
+        them than the send queue holds, the client gets a full snapshot
+        instead (or is told to resync if there is no snapshot provider).
+        """
+        conn = self.active_connections.get(websocket)
+        if conn is None:
+            return
+
+        oldest = self._replay[0][0] if self._replay else self.seq + 1
+        if epoch != self.epoch or last_seq > self.seq or last_seq + 1 < oldest:
+            await self._resync(conn, "epoch" if epoch != self.epoch else "gap")
+            return
+
+        missed = self._missed(conn, last_seq)
+        if not self._requeue(conn, OutboundFrame({
+            "event": "resumed",
+            "replayed": len(missed),
+            "seq": self.seq,
+            "epoch": self.epoch,
+            "timestamp": datetime.utcnow().isoformat()
+        }), missed):
+            await self._resync(conn, "overflow")
+            return
+        self.resumes += 1
+
+    async def _resync(self, conn: ClientConnection, reason: str):
+        """A resume that cannot be replayed: send the snapshot, or ask for a resync"""
+        self.resume_gaps += 1
+        if self._snapshot is not None:
+            await self.send_snapshot(conn.websocket)
+            return
+        self._fan_out([conn], OutboundFrame({
+            "event": "resync_required",
+            "reason": reason,
+            "seq": self.seq,
+            "epoch": self.epoch,
+            "timestamp": datetime.utcnow().isoformat()
+        }))
+
+    async def send_snapshot(self, websocket: WebSocket):
+        """Push the full-state snapshot frame to one connection"""
+        conn = self.active_connections.get(websocket)
+        if conn is None or self._snapshot is None:
+            return
+
+        # Taken before building: events delivered while the snapshot is being
+        # read may or may not be in it, so everything after `since` is
+        # replayed after it (state events are idempotent)
+        since = self.seq
+        try:
+            frame = await self._snapshot(conn.user_id)
+        except Exception as e:
+            logger.error(f"Error building WebSocket snapshot: {e}")
+            return
+        if websocket not in self.active_connections:
+            return
+
+        frame = f'{frame[:-1]}, "seq": {since}, "epoch": "{self.epoch}"}}'
+        if not self._requeue(conn, OutboundFrame(text=frame), self._missed(conn, since)):
+            # More events arrived while building than the queue holds
+            self._enqueue(conn, OutboundFrame({
+                "event": "resync_required",
+                "reason": "overflow",
+                "seq": self.seq,
+                "epoch": self.epoch,
+                "timestamp": datetime.utcnow().isoformat()
+            }), time.perf_counter())
+            return
+        self.snapshots_sent += 1
+
+    async def broadcast(self, message: dict, topic: Optional[str] = None):
+        """Broadcast message to a topic's subscribers (or every client if no topic)"""
+        # Add timestamp to message
         message["timestamp"] = datetime.utcnow().isoformat()
-        message_str = json.dumps(message)
-        
-        if user_id not in self.user_connections:
+
+        if settings.WS_COALESCE_WINDOW_MS <= 0:
+            # Published once; every worker (including this one) delivers it locally
+            await self.backplane.publish(topic, message)
             return
-        
-        disconnected = set()
-        for connection in self.user_connections[user_id]:
+
+        self._hold(topic, message)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(
+                self._flush_after(settings.WS_COALESCE_WINDOW_MS / 1000)
+            )
+
+    def _hold(self, topic: Optional[str], message: dict):
+        """Add an event to the coalescing window, replacing a superseded machine_update"""
+        pending = self._pending.setdefault(topic, [])
+        if message.get("event") == "machine_update":
+            key = _machine_key(message["data"])
+            for i, held in enumerate(pending):
+                if held.get("event") == "machine_update" and _machine_key(held["data"]) == key:
+                    # Later fields win; fields only the earlier update carried are kept
+                    message = {**message, "data": {**held["data"], **message["data"]}}
+                    del pending[i]
+                    self.events_superseded += 1
+                    break
+        pending.append(message)
+
+    async def _flush_after(self, delay: float):
+        await asyncio.sleep(delay)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        """Publish held events: one frame per topic, batched when there are several"""
+        pending, self._pending = self._pending, {}
+        for topic, messages in pending.items():
+            if len(messages) == 1:
+                message = messages[0]
+            else:
+                message = {
+                    "event": "batch",
+                    "events": messages,
+                    "timestamp": datetime.utcnow().isoformat()
+                }
+                self.batches_sent += 1
+                self.events_batched += len(messages)
             try:
-                await connection.send_text(message_str)
+                await self.backplane.publish(topic, message)
             except Exception as e:
-                logger.error(f"Error sending message to user {user_id}: {e}")
-                disconnected.add(connection)
-        
-        # Clean up disconnected connections
-        for conn in disconnected:
-            self.disconnect(conn, user_id)
-    
+                logger.error(f"Error publishing coalesced events for {topic}: {e}")
+
+    async def publish_cache_event(self, event: dict):
+        """Tell every other worker to drop or reload a cached entry"""
+        event["origin"] = self.epoch
+        await self.backplane.publish(CACHE_TOPIC, event)
+
+    async def _deliver(self, topic: Optional[str], message: dict):
+        """Sequence an event and fan it out to this process's subscribers"""
+        if topic == CACHE_TOPIC:
+            event = message
+            # This process already applied its own changes
+            if self._cache_handler is not None and event.get("origin") != self.epoch:
+                try:
+                    await self._cache_handler(event)
+                except Exception as e:
+                    logger.error(f"Failed to apply cache event {event}: {e}")
+            return
+        self.seq += 1
+        seq = self.seq
+        # A copy: the backplane may still serialize the published dict for other workers
+        frame = OutboundFrame({**message, "seq": seq, "epoch": self.epoch})
+        self._replay.append((seq, topic, frame))
+
+        if topic is None:
+            sockets = self.active_connections.keys()
+        else:
+            sockets = self.topic_subscribers.get(topic)
+            if not sockets:
+                return
+
+        connections = [
+            self.active_connections[ws]
+            for ws in sockets
+            if ws in self.active_connections
+        ]
+        self._fan_out(connections, frame, seq)
+
+    async def broadcast_to_user(self, user_id: int, message: dict):
+        """Broadcast message to specific user's connections"""
+        await self.broadcast(message, user_topic(user_id))
+
     async def broadcast_machine_update(self, machine_data: dict):
         """Broadcast machine status update"""
         message = {
             "event": "machine_update",
             "data": machine_data
         }
-        await self.broadcast(message)
-    
+        await self.broadcast(message, f"machines:{_type_value(machine_data['machine_type'])}")
+
     async def broadcast_waitlist_update(self, machine_type: str, waitlist_data: list):
         """Broadcast waitlist update"""
         message = {
@@ -92,16 +636,16 @@ class ConnectionManager:
             "machine_type": machine_type,
             "data": waitlist_data
         }
-        await self.broadcast(message)
-    
+        await self.broadcast(message, f"waitlist:{_type_value(machine_type)}")
+
     async def broadcast_activity(self, activity_data: dict):
         """Broadcast activity log entry"""
         message = {
             "event": "activity_logged",
             "data": activity_data
         }
-        await self.broadcast(message)
-    
+        await self.broadcast(message, "activities")
+
     async def broadcast_notification(self, user_id: int, notification_data: dict):
         """Broadcast notification to user"""
         message = {
@@ -109,22 +653,88 @@ class ConnectionManager:
             "data": notification_data
         }
         await self.broadcast_to_user(user_id, message)
-    
+
+    async def broadcast_unread_count(self, user_id: int, unread_count: int):
+        """Push a user's new unread notification count"""
+        message = {
+            "event": "unread_count",
+            "data": {"unread_count": unread_count}
+        }
+        await self.broadcast_to_user(user_id, message)
+
     async def broadcast_fault_report(self, fault_data: dict):
         """Broadcast fault report"""
         message = {
             "event": "fault_reported",
             "data": fault_data
         }
-        await self.broadcast(message)
-    
+        await self.broadcast(message, "faults")
+
     def get_connection_count(self) -> int:
         """Get total number of active connections"""
         return len(self.active_connections)
-    
+
     def get_user_connection_count(self, user_id: int) -> int:
         """Get number of connections for a specific user"""
         return len(self.user_connections.get(user_id, set()))
 
+    def get_metrics(self) -> dict:
+        """Queue depth and fan-out figures"""
+        depths = [conn.queue.qsize() for conn in self.active_connections.values()]
+        queued_bytes = sum(
+            len(item[0])
+            for conn in self.active_connections.values()
+            for item in list(conn.queue._queue)
+        )
+
+        def percentile(samples, p: float) -> Optional[float]:
+            if not samples:
+                return None
+            ordered = sorted(samples)
+            return round(ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))] * 1000, 2)
+
+        return {
+            "connections": len(self.active_connections),
+            "max_connections": settings.MAX_ACTIVE_CONNECTIONS,
+            "users": len(self.user_connections),
+            "max_connections_for_one_user": max(
+                (len(sockets) for sockets in self.user_connections.values()), default=0
+            ),
+            "rejected_at_capacity": self.rejected_at_capacity,
+            "rejected_over_user_limit": self.rejected_over_user_limit,
+            "idle_reaped": self.idle_reaped,
+            "topics": {topic: len(subs) for topic, subs in self.topic_subscribers.items()},
+            "backplane": self.backplane.get_metrics(),
+            "seq": self.seq,
+            "epoch": self.epoch,
+            "replay_buffer": len(self._replay),
+            "resumes": self.resumes,
+            "resume_gaps": self.resume_gaps,
+            "snapshots_sent": self.snapshots_sent,
+            "coalesce_window_ms": settings.WS_COALESCE_WINDOW_MS,
+            "batches_sent": self.batches_sent,
+            "events_batched": self.events_batched,
+            "events_superseded": self.events_superseded,
+            "queued_frames": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "encodings": {
+                encoding: sum(1 for conn in self.active_connections.values() if conn.encoding == encoding)
+                for encoding in ENCODINGS
+            },
+            "bytes_sent": self.bytes_sent,
+            "queued_bytes": queued_bytes,
+            "frames_sent": self.frames_sent,
+            "slow_consumer_resyncs": self.slow_consumer_resyncs,
+            "slow_consumer_evictions": self.slow_consumer_evictions,
+            "fanout_ms": {
+                "p50": percentile(self._fanout_latencies, 0.50),
+                "p99": percentile(self._fanout_latencies, 0.99),
+            },
+            "delivery_ms": {
+                "p50": percentile(self._delivery_latencies, 0.50),
+                "p99": percentile(self._delivery_latencies, 0.99),
+            },
+        }
+
 # Global connection manager instance
 manager = ConnectionManager()
@@ -0,0 +1,18 @@
+"""
+Gunicorn Worker
+
+uvicorn's UvicornWorker with the server options this app reads from settings
+(gunicorn never passes them to uvicorn). Use it in place of
+uvicorn.workers.UvicornWorker:
+
+    gunicorn -w 1 -k app.worker.UvicornWorker -b 0.0.0.0:8000 app.main:app
+"""
+from uvicorn.workers import UvicornWorker as BaseUvicornWorker
+
+from config import settings
+
+class UvicornWorker(BaseUvicornWorker):
+    CONFIG_KWARGS = {
+        **BaseUvicornWorker.CONFIG_KWARGS,
+        "ws_per_message_deflate": settings.WS_PER_MESSAGE_DEFLATE,
+    }
@@ -0,0 +1,200 @@
+"""
+Group-Commit Write Queue
+
+SQLite has one writer and every commit pays for a WAL sync, so under load
+the commit itself becomes the bottleneck. Routes hand their writes to
+``run_unit_of_work`` as a unit of work: an async function that receives a
+session, does its reads and writes and returns a result. With group commit
+enabled a single writer task runs several queued units inside one
+transaction, each in its own savepoint, and commits them together. Each
+caller gets its own result, or its own exception if only its unit failed.
+
+Units must not commit, roll back or await anything other than the session
+(broadcasts and cache updates belong after ``run_unit_of_work`` returns,
+once the data is committed). Objects a unit returns are detached with their
+loaded state.
+"""
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, List, Optional, Tuple, TypeVar
+import asyncio
+import logging
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+UnitOfWork = Callable[[AsyncSession], Awaitable[T]]
+
+class GroupCommitWriter:
+    """Single writer task committing queued units of work in batches"""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.batches = 0
+        self.units = 0
+        self.failed_units = 0
+        self.failed_commits = 0
+        self.max_batch = 0
+        self._batch_sizes: Deque[int] = deque(maxlen=1000)
+        self._commit_latencies: Deque[float] = deque(maxlen=1000)
+
+    @property
+    def enabled(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        """Start the writer task if group commit is enabled"""
+        if not settings.GROUP_COMMIT_ENABLED:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Group commit enabled (window {settings.GROUP_COMMIT_WINDOW_MS} ms, "
+            f"max batch {settings.GROUP_COMMIT_MAX_BATCH})"
+        )
+
+    async def stop(self):
+        """Commit whatever is queued, then stop the writer task"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    async def submit(self, unit: UnitOfWork) -> T:
+        """Run a unit of work and return its result once it is committed"""
+        if self._task is None:
+            return await self._run_alone(unit)
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((unit, future))
+        return await future
+
+    async def _run_alone(self, unit: UnitOfWork) -> T:
+        async with AsyncSessionLocal() as db:
+            try:
+                result = await unit(db)
+                await db.commit()
+                return result
+            except Exception:
+                await db.rollback()
+                raise
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+
+            # Take what is already queued, then wait up to the window for more
+            deadline = time.monotonic() + settings.GROUP_COMMIT_WINDOW_MS / 1000
+            while len(batch) < settings.GROUP_COMMIT_MAX_BATCH:
+                try:
+                    if self._queue.empty():
+                        timeout = deadline - time.monotonic()
+                        if timeout <= 0:
+                            break
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    else:
+                        item = self._queue.get_nowait()
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                await self._commit_batch(batch)
+            except Exception as e:
+                logger.error(f"Group commit batch failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _commit_batch(self, batch: List[Tuple[UnitOfWork, asyncio.Future]]):
+        outcomes: List[Tuple[asyncio.Future, Any, Optional[BaseException]]] = []
+        started = time.perf_counter()
+
+        async with AsyncSessionLocal() as db:
+            for unit, future in batch:
+                if future.cancelled():
+                    continue  # caller went away before its turn
+                try:
+                    async with db.begin_nested():
+                        result = await unit(db)
+                    outcomes.append((future, result, None))
+                except Exception as e:
+                    self.failed_units += 1
+                    outcomes.append((future, None, e))
+                finally:
+                    # Units share the session; keep their objects apart
+                    db.expunge_all()
+
+            try:
+                await db.commit()
+            except Exception as e:
+                self.failed_commits += 1
+                logger.error(f"Group commit of {len(outcomes)} units failed: {e}")
+                await db.rollback()
+                outcomes = [
+                    (future, None, error if error is not None else e)
+                    for future, _, error in outcomes
+                ]
+
+        self.batches += 1
+        self.units += len(outcomes)
+        self.max_batch = max(self.max_batch, len(outcomes))
+        self._batch_sizes.append(len(outcomes))
+        self._commit_latencies.append(time.perf_counter() - started)
+
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def get_metrics(self) -> dict:
+        """Batch sizes and commit latency"""
+        def percentile(samples, p: float) -> Optional[float]:
+            if not samples:
+                return None
+            ordered = sorted(samples)
+            return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+        p50 = percentile(self._commit_latencies, 0.50)
+        p99 = percentile(self._commit_latencies, 0.99)
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "units": self.units,
+            "failed_units": self.failed_units,
+            "failed_commits": self.failed_commits,
+            "mean_batch": round(sum(self._batch_sizes) / len(self._batch_sizes), 2) if self._batch_sizes else None,
+            "max_batch": self.max_batch,
+            "batch_ms": {
+                "p50": round(p50 * 1000, 2) if p50 is not None else None,
+                "p99": round(p99 * 1000, 2) if p99 is not None else None,
+            },
+        }
+
+# Global group-commit writer instance
+group_writer = GroupCommitWriter()
+
+async def run_unit_of_work(unit: UnitOfWork) -> T:
+    """Run a unit of work on the writer, group-committed when enabled"""
+    return await group_writer.submit(unit)
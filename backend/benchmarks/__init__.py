@@ -0,0 +1,3 @@
+"""
+Benchmarks and load-test tools for the KY Wash backend
+"""
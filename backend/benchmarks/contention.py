@@ -0,0 +1,224 @@
+"""
+Machine State Transition Contention Benchmark
+
+Hammers a few machines with concurrent start/cancel attempts and compares the
+old read-check-write transition (SELECT, Python status check, mutate, commit)
+with the compare-and-set UPDATE ... WHERE status = expected RETURNING used by
+the machine routes. Reports conflicts per second, latency percentiles and
+"double starts" (two users both told they started the same machine).
+
+Usage (from the backend directory):
+
+    python -m benchmarks.contention --workers 50 --duration 10 --json results.json
+
+The benchmark uses its own throwaway SQLite database unless DATABASE_URL is set.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "contention.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, update, and_, delete
+from app.database import AsyncSessionLocal, init_db, close_db
+from app.models import Machine, MachineType, MachineStatus, User
+
+# ============ Transition strategies ============
+
+async def legacy_start(db, machine_id: int, user_id: int) -> bool:
+    result = await db.execute(
+        select(Machine).where(
+            and_(Machine.machine_type == MachineType.WASHER, Machine.machine_id == machine_id)
+        )
+    )
+    machine = result.scalar_one()
+    if machine.status != MachineStatus.AVAILABLE:
+        await db.rollback()
+        return False
+    machine.status = MachineStatus.IN_USE
+    machine.current_user_id = user_id
+    machine.total_cycles += 1
+    await db.commit()
+    return True
+
+async def legacy_cancel(db, machine_id: int, user_id: int) -> bool:
+    result = await db.execute(
+        select(Machine).where(
+            and_(Machine.machine_type == MachineType.WASHER, Machine.machine_id == machine_id)
+        )
+    )
+    machine = result.scalar_one()
+    if machine.status != MachineStatus.IN_USE or machine.current_user_id != user_id:
+        await db.rollback()
+        return False
+    machine.status = MachineStatus.AVAILABLE
+    machine.current_user_id = None
+    await db.commit()
+    return True
+
+async def cas_start(db, machine_id: int, user_id: int) -> bool:
+    result = await db.execute(
+        update(Machine)
+        .where(
+            and_(
+                Machine.machine_type == MachineType.WASHER,
+                Machine.machine_id == machine_id,
+                Machine.status == MachineStatus.AVAILABLE
+            )
+        )
+        .values(
+            status=MachineStatus.IN_USE,
+            current_user_id=user_id,
+            total_cycles=Machine.total_cycles + 1
+        )
+        .returning(Machine.id)
+    )
+    won = result.scalar_one_or_none() is not None
+    await (db.commit() if won else db.rollback())
+    return won
+
+async def cas_cancel(db, machine_id: int, user_id: int) -> bool:
+    result = await db.execute(
+        update(Machine)
+        .where(
+            and_(
+                Machine.machine_type == MachineType.WASHER,
+                Machine.machine_id == machine_id,
+                Machine.status == MachineStatus.IN_USE,
+                Machine.current_user_id == user_id
+            )
+        )
+        .values(status=MachineStatus.AVAILABLE, current_user_id=None)
+        .returning(Machine.id)
+    )
+    won = result.scalar_one_or_none() is not None
+    await (db.commit() if won else db.rollback())
+    return won
+
+STRATEGIES = {
+    "legacy": (legacy_start, legacy_cancel),
+    "cas": (cas_start, cas_cancel),
+}
+
+# ============ Harness ============
+
+async def reset_machines(machines: int):
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Machine))
+        for i in range(1, machines + 1):
+            db.add(Machine(machine_id=i, machine_type=MachineType.WASHER, status=MachineStatus.AVAILABLE))
+        await db.commit()
+
+async def ensure_users(count: int):
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(User.id))
+        existing = len(result.all())
+        for i in range(existing, count):
+            db.add(User(student_id=f"{900000 + i}", pin_hash="x", phone_number="0000000000"))
+        await db.commit()
+
+def percentile(samples, p: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+async def run_strategy(name: str, workers: int, duration: float, machines: int) -> dict:
+    start_fn, cancel_fn = STRATEGIES[name]
+    await reset_machines(machines)
+
+    latencies = []
+    attempts = conflicts = double_starts = 0
+    owners = {}  # machine_id -> user that was told it won
+    deadline = time.perf_counter() + duration
+
+    async def worker(user_id: int):
+        nonlocal attempts, conflicts, double_starts
+        while time.perf_counter() < deadline:
+            machine_id = random.randint(1, machines)
+            async with AsyncSessionLocal() as db:
+                started = time.perf_counter()
+                won = await start_fn(db, machine_id, user_id)
+                latencies.append(time.perf_counter() - started)
+                attempts += 1
+                if not won:
+                    conflicts += 1
+                    await asyncio.sleep(0)
+                    continue
+
+                if owners.get(machine_id) is not None:
+                    double_starts += 1
+                owners[machine_id] = user_id
+
+                await asyncio.sleep(0)
+                if owners.get(machine_id) == user_id:
+                    owners[machine_id] = None
+
+                started = time.perf_counter()
+                won = await cancel_fn(db, machine_id, user_id)
+                latencies.append(time.perf_counter() - started)
+                attempts += 1
+                if not won:
+                    conflicts += 1
+
+    wall = time.perf_counter()
+    await asyncio.gather(*(worker(user_id) for user_id in range(1, workers + 1)))
+    wall = time.perf_counter() - wall
+
+    return {
+        "strategy": name,
+        "workers": workers,
+        "machines": machines,
+        "duration_s": round(wall, 2),
+        "attempts": attempts,
+        "conflicts": conflicts,
+        "conflicts_per_s": round(conflicts / wall, 1),
+        "transitions_per_s": round(attempts / wall, 1),
+        "double_starts": double_starts,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+            "mean": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        },
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=50, help="concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per strategy")
+    parser.add_argument("--machines", type=int, default=1, help="number of contended machines")
+    parser.add_argument("--strategy", choices=["legacy", "cas", "both"], default="both")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    await init_db()
+    await ensure_users(args.workers)
+
+    names = ["legacy", "cas"] if args.strategy == "both" else [args.strategy]
+    results = []
+    for name in names:
+        result = await run_strategy(name, args.workers, args.duration, args.machines)
+        results.append(result)
+        print(
+            f"{name:>6}: {result['transitions_per_s']:>8} transitions/s  "
+            f"{result['conflicts_per_s']:>8} conflicts/s  "
+            f"p50 {result['latency_ms']['p50']:>7} ms  p99 {result['latency_ms']['p99']:>7} ms  "
+            f"double starts {result['double_starts']}"
+        )
+
+    await close_db()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"benchmark": "contention", "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    asyncio.run(main())
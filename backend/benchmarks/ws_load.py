@@ -0,0 +1,340 @@
+"""
+WebSocket Fan-Out Load Test
+
+Opens N simulated WebSocket clients against a running server while a few
+REST "actors" drive a realistic mix of start/cancel and waitlist join/leave
+traffic. Reports:
+
+- end-to-end delivery latency: from the REST request that caused an event
+  to each client receiving it (p50/p95/p99/max)
+- connection setup time and refused/failed connections
+- REST latency and actions per second
+- server CPU and memory per connection, sampled from /api/metrics
+
+Start the server with enough headroom, then run (from the backend directory):
+
+    MAX_ACTIVE_CONNECTIONS=20000 METRICS_TOKEN=secret uvicorn app.main:app --port 8000
+    METRICS_TOKEN=secret python -m benchmarks.ws_load --clients 2000 --duration 30 --json ws_load.json
+
+Opening more than ~1000 sockets usually needs a higher open-file limit
+(``ulimit -n``) on both sides. With several server workers, /api/metrics
+describes only the worker that answered.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import httpx
+import websockets
+
+MACHINE_TYPES = ("washer", "dryer")
+MACHINES_PER_TYPE = 6
+
+def percentile(samples, p: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+def summarize_ms(samples) -> dict:
+    return {
+        "count": len(samples),
+        "p50": round(percentile(samples, 0.50) * 1000, 2),
+        "p95": round(percentile(samples, 0.95) * 1000, 2),
+        "p99": round(percentile(samples, 0.99) * 1000, 2),
+        "max": round(max(samples) * 1000, 2) if samples else 0.0,
+        "mean": round(statistics.fmean(samples) * 1000, 2) if samples else 0.0,
+    }
+
+def raise_open_file_limit(wanted: int):
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.base_url = args.url.rstrip("/")
+        self.ws_url = self.base_url.replace("http", "ws", 1) + "/api/ws"
+        if args.encoding != "json":
+            self.ws_url += f"?encoding={args.encoding}"
+
+        # (machine_type, machine_id, status) -> when the REST call was sent
+        self.actions = {}
+        self.delivery_latencies = []
+        self.connect_times = []
+        self.rest_latencies = []
+        self.connected = 0
+        self.refused = 0
+        self.failed = 0
+        self.dropped = 0
+        self.frames = 0
+        self.events = 0
+        self.bytes_received = 0
+        self.actions_sent = 0
+        self.action_errors = 0
+        self.stopping = asyncio.Event()
+
+    # ============ Simulated clients ============
+
+    def _decode(self, frame):
+        if isinstance(frame, bytes):
+            import msgpack
+            return msgpack.unpackb(frame)
+        return json.loads(frame)
+
+    def _record(self, message: dict, received_at: float):
+        if message.get("event") == "batch":
+            for event in message["events"]:
+                self._record(event, received_at)
+            return
+
+        self.events += 1
+        if message.get("event") != "machine_update":
+            return
+        data = message.get("data", {})
+        sent_at = self.actions.get((data.get("machine_type"), data.get("machine_id"), data.get("status")))
+        if sent_at is not None:
+            self.delivery_latencies.append(received_at - sent_at)
+
+    async def client(self):
+        started = time.perf_counter()
+        try:
+            ws = await websockets.connect(self.ws_url, max_size=None, open_timeout=30)
+        except Exception:
+            self.failed += 1
+            return
+
+        try:
+            await ws.send("{}")  # anonymous hello; public topics only
+            self.connect_times.append(time.perf_counter() - started)
+            self.connected += 1
+            while not self.stopping.is_set():
+                frame = await ws.recv()
+                received_at = time.perf_counter()
+                self.frames += 1
+                self.bytes_received += len(frame)
+                message = self._decode(frame)
+                if message.get("event") == "ping":
+                    await ws.send('{"action": "pong"}')
+                    continue
+                self._record(message, received_at)
+        except websockets.ConnectionClosed as e:
+            if e.rcvd is not None and e.rcvd.code == 1013:
+                self.refused += 1
+            elif not self.stopping.is_set():
+                self.dropped += 1
+        finally:
+            await ws.close()
+
+    # ============ REST actors ============
+
+    async def login(self, http: httpx.AsyncClient, index: int) -> str:
+        credentials = {"student_id": f"{700000 + index}", "pin": "1234"}
+        response = await http.post(
+            "/api/v1/auth/register",
+            json={**credentials, "phone_number": "0123456789"}
+        )
+        if response.status_code != 200:
+            response = await http.post("/api/v1/auth/login", json=credentials)
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+    async def act(self, http: httpx.AsyncClient, path: str, body: dict, headers: dict, key=None):
+        if key is not None:
+            self.actions[key] = time.perf_counter()
+        started = time.perf_counter()
+        try:
+            response = await http.post(path, json=body, headers=headers)
+            self.rest_latencies.append(time.perf_counter() - started)
+            self.actions_sent += 1
+            return response.status_code == 200
+        except httpx.HTTPError:
+            self.action_errors += 1
+            return False
+
+    async def actor(self, http: httpx.AsyncClient, index: int, interval: float):
+        headers = {"Authorization": f"Bearer {await self.login(http, index)}"}
+        while not self.stopping.is_set():
+            machine_type = random.choice(MACHINE_TYPES)
+            if random.random() < 0.2:
+                # Waitlist churn
+                await self.act(http, "/api/v1/waitlist/join", {"machine_type": machine_type}, headers)
+                await asyncio.sleep(interval)
+                await self.act(http, "/api/v1/waitlist/leave", {"machine_type": machine_type}, headers)
+            else:
+                machine_id = random.randint(1, MACHINES_PER_TYPE)
+                started = await self.act(
+                    http, "/api/v1/machines/start",
+                    {"machine_id": machine_id, "machine_type": machine_type, "category": "normal"},
+                    headers, key=(machine_type, machine_id, "in_use")
+                )
+                await asyncio.sleep(interval)
+                if started:
+                    await self.act(
+                        http, "/api/v1/machines/cancel",
+                        {"machine_id": machine_id, "machine_type": machine_type},
+                        headers, key=(machine_type, machine_id, "available")
+                    )
+            await asyncio.sleep(interval)
+
+    # ============ Run ============
+
+    async def server_metrics(self, http: httpx.AsyncClient) -> dict:
+        response = await http.get(
+            "/api/metrics", headers={"Authorization": f"Bearer {self.args.metrics_token}"}
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def run(self) -> dict:
+        args = self.args
+        raise_open_file_limit(args.clients + 256)
+
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=30) as http:
+            baseline = await self.server_metrics(http)
+
+            # Ramp up connections in batches
+            ramp_started = time.perf_counter()
+            clients = []
+            for start in range(0, args.clients, args.ramp_batch):
+                batch = min(args.ramp_batch, args.clients - start)
+                clients.extend(asyncio.create_task(self.client()) for _ in range(batch))
+                await asyncio.sleep(args.ramp_interval)
+            while self.connected + self.failed + self.refused < args.clients:
+                if time.perf_counter() - ramp_started > 120:
+                    break
+                await asyncio.sleep(0.2)
+            ramp_seconds = time.perf_counter() - ramp_started
+            connected_metrics = await self.server_metrics(http)
+
+            # Drive traffic
+            interval = args.actors / args.rate if args.rate > 0 else 1.0
+            actors = [
+                asyncio.create_task(self.actor(http, index, interval / 2))
+                for index in range(args.actors)
+            ]
+            load_started = time.perf_counter()
+            await asyncio.sleep(args.duration)
+            load_seconds = time.perf_counter() - load_started
+            final_metrics = await self.server_metrics(http)
+
+            self.stopping.set()
+            for task in actors + clients:
+                task.cancel()
+            await asyncio.gather(*actors, *clients, return_exceptions=True)
+
+        return self.report(baseline, connected_metrics, final_metrics, ramp_seconds, load_seconds)
+
+    def report(self, baseline: dict, connected: dict, final: dict, ramp_seconds: float, load_seconds: float) -> dict:
+        base_rss = baseline["process"]["rss_mb"]
+        connected_rss = connected["process"]["rss_mb"]
+        cpu_seconds = final["process"]["cpu_seconds"] - connected["process"]["cpu_seconds"]
+        websocket = final["websocket"]
+
+        per_connection_kb = None
+        if base_rss is not None and connected_rss is not None and self.connected:
+            per_connection_kb = round((connected_rss - base_rss) * 1024 / self.connected, 1)
+
+        return {
+            "benchmark": "ws_load",
+            "config": {
+                "url": self.base_url,
+                "clients": self.args.clients,
+                "actors": self.args.actors,
+                "target_actions_per_s": self.args.rate,
+                "duration_s": self.args.duration,
+                "encoding": self.args.encoding,
+            },
+            "connections": {
+                "connected": self.connected,
+                "refused": self.refused,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "ramp_s": round(ramp_seconds, 2),
+                "connect_ms": summarize_ms(self.connect_times),
+            },
+            "traffic": {
+                "actions": self.actions_sent,
+                "action_errors": self.action_errors,
+                "actions_per_s": round(self.actions_sent / load_seconds, 1),
+                "rest_ms": summarize_ms(self.rest_latencies),
+                "frames_received": self.frames,
+                "events_received": self.events,
+                "events_per_s": round(self.events / load_seconds, 1),
+                "bytes_received": self.bytes_received,
+            },
+            "delivery_ms": summarize_ms(self.delivery_latencies),
+            "server": {
+                "rss_mb_idle": base_rss,
+                "rss_mb_connected": connected_rss,
+                "rss_mb_final": final["process"]["rss_mb"],
+                "rss_per_connection_kb": per_connection_kb,
+                "cpu_percent_under_load": round(100 * cpu_seconds / load_seconds, 1),
+                "frames_sent": websocket.get("frames_sent"),
+                "slow_consumer_resyncs": websocket.get("slow_consumer_resyncs"),
+                "slow_consumer_evictions": websocket.get("slow_consumer_evictions"),
+                "fanout_ms": websocket.get("fanout_ms"),
+                "server_delivery_ms": websocket.get("delivery_ms"),
+            },
+        }
+
+def print_report(result: dict):
+    connections = result["connections"]
+    traffic = result["traffic"]
+    delivery = result["delivery_ms"]
+    server = result["server"]
+    print(
+        f"connections: {connections['connected']} ok, {connections['refused']} refused, "
+        f"{connections['failed']} failed, {connections['dropped']} dropped "
+        f"(ramp {connections['ramp_s']} s, connect p99 {connections['connect_ms']['p99']} ms)"
+    )
+    print(
+        f"traffic:     {traffic['actions_per_s']} actions/s (REST p99 {traffic['rest_ms']['p99']} ms), "
+        f"{traffic['events_per_s']} events/s received"
+    )
+    print(
+        f"delivery:    p50 {delivery['p50']} ms  p95 {delivery['p95']} ms  "
+        f"p99 {delivery['p99']} ms  max {delivery['max']} ms  ({delivery['count']} samples)"
+    )
+    print(
+        f"server:      {server['cpu_percent_under_load']}% CPU under load, "
+        f"{server['rss_per_connection_kb']} KB RSS per connection"
+    )
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000", help="server base URL")
+    parser.add_argument("--clients", type=int, default=1000, help="simulated WebSocket clients")
+    parser.add_argument("--actors", type=int, default=10, help="REST users driving traffic")
+    parser.add_argument("--rate", type=float, default=20.0, help="target REST actions per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of traffic")
+    parser.add_argument("--ramp-batch", type=int, default=200, help="connections opened per ramp step")
+    parser.add_argument("--ramp-interval", type=float, default=0.5, help="seconds between ramp steps")
+    parser.add_argument("--encoding", choices=["json", "msgpack"], default="json")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument(
+        "--metrics-token", default=os.getenv("METRICS_TOKEN", ""), help="the server's METRICS_TOKEN"
+    )
+    args = parser.parse_args()
+
+    result = await LoadTest(args).run()
+    print_report(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -20,11 +20,58 @@ class Settings(BaseModel):
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./kywash.db")
     SQLALCHEMY_ECHO: bool = False
     
+    # Connection pool (PostgreSQL)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "20"))  # persistent connections
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "0"))  # extra connections opened under burst
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a connection
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; -1 to never recycle
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    
+    # Read replica (PostgreSQL): GET routes read from it when set
+    DATABASE_REPLICA_URL: str = os.getenv("DATABASE_REPLICA_URL", "")
+    READ_STICKY_SECONDS: float = float(os.getenv("READ_STICKY_SECONDS", "5"))  # primary reads after a user's write
+    
+    # SQLite tuning (file databases only)
+    SQLITE_READ_POOL_SIZE: int = int(os.getenv("SQLITE_READ_POOL_SIZE", "4"))  # read-only connections
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", "268435456"))  # bytes (256 MB)
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))  # page cache per connection
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    
+    # Activity log: audit-critical types are written with the change, the rest in the background
+    ACTIVITY_SYNC_TYPES: List[str] = os.getenv("ACTIVITY_SYNC_TYPES", "fault_reported,machine_disabled").split(",")
+    ACTIVITY_FLUSH_INTERVAL_MS: int = int(os.getenv("ACTIVITY_FLUSH_INTERVAL_MS", "500"))
+    ACTIVITY_FLUSH_BATCH: int = int(os.getenv("ACTIVITY_FLUSH_BATCH", "200"))  # flush early once this many entries are buffered
+    ACTIVITY_QUEUE_MAX: int = int(os.getenv("ACTIVITY_QUEUE_MAX", "10000"))  # oldest entries are dropped beyond this while flushes fail
+    
+    # Activity archive: old activities move to gzip NDJSON files, one per day
+    ACTIVITY_ARCHIVE_ENABLED: bool = os.getenv("ACTIVITY_ARCHIVE_ENABLED", "false").lower() == "true"
+    ACTIVITY_ARCHIVE_DIR: str = os.getenv("ACTIVITY_ARCHIVE_DIR", "./archive")
+    ACTIVITY_ARCHIVE_AFTER_DAYS: int = int(os.getenv("ACTIVITY_ARCHIVE_AFTER_DAYS", "90"))
+    ACTIVITY_ARCHIVE_INTERVAL_HOURS: float = float(os.getenv("ACTIVITY_ARCHIVE_INTERVAL_HOURS", "6"))
+    
+    # Group commit: batch concurrent write transactions into one commit
+    GROUP_COMMIT_ENABLED: bool = os.getenv("GROUP_COMMIT_ENABLED", "false").lower() == "true"
+    GROUP_COMMIT_WINDOW_MS: float = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "2"))  # how long the writer waits to fill a batch
+    GROUP_COMMIT_MAX_BATCH: int = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "64"))
+    
     # JWT
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production-12345678")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 24 hours
     
+    # /api/metrics: exposes process and capacity internals, so it needs this bearer token
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")  # empty = endpoint disabled
+    
+    # Auth cache (verified tokens and their users)
+    AUTH_CACHE_TTL_SECONDS: int = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+    AUTH_CACHE_MAX_ENTRIES: int = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "4096"))
+    
+    # Password Hashing
+    HASH_EXECUTOR_KIND: str = os.getenv("HASH_EXECUTOR_KIND", "thread")  # "thread" or "process"
+    HASH_EXECUTOR_WORKERS: int = int(os.getenv("HASH_EXECUTOR_WORKERS", "4"))
+    HASH_EXECUTOR_MAX_QUEUE: int = int(os.getenv("HASH_EXECUTOR_MAX_QUEUE", "64"))  # 503 beyond this
+    HASH_BACKPRESSURE_RETRY_AFTER: int = 2  # seconds
+    
     # CORS
     CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:8000", "http://127.0.0.1:3000"]
     CORS_ALLOW_CREDENTIALS: bool = True
@@ -32,8 +79,18 @@ class Settings(BaseModel):
     CORS_ALLOW_HEADERS: List[str] = ["*"]
     
     # WebSocket
-    WEBSOCKET_HEARTBEAT_INTERVAL: int = 30  # seconds
-    MAX_ACTIVE_CONNECTIONS: int = 100
+    WEBSOCKET_HEARTBEAT_INTERVAL: int = int(os.getenv("WEBSOCKET_HEARTBEAT_INTERVAL", "30"))  # seconds
+    WS_AUTH_TIMEOUT: float = 5.0  # seconds to wait for the first frame's token before continuing anonymously
+    WEBSOCKET_IDLE_TIMEOUT: int = int(os.getenv("WEBSOCKET_IDLE_TIMEOUT", "75"))  # seconds without any client frame before a socket is reaped
+    MAX_ACTIVE_CONNECTIONS: int = int(os.getenv("MAX_ACTIVE_CONNECTIONS", "100"))
+    MAX_CONNECTIONS_PER_USER: int = int(os.getenv("MAX_CONNECTIONS_PER_USER", "5"))  # further connections are refused with 1008
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))  # outbound frames buffered per connection
+    WS_SEND_TIMEOUT: float = float(os.getenv("WS_SEND_TIMEOUT", "10"))  # seconds a single send may take before eviction
+    WS_SLOW_CONSUMER_POLICY: str = os.getenv("WS_SLOW_CONSUMER_POLICY", "resync")  # "resync" or "drop" when a queue overflows
+    WS_COALESCE_WINDOW_MS: int = int(os.getenv("WS_COALESCE_WINDOW_MS", "0"))  # batch bursts per topic; 0 = send immediately
+    WS_PER_MESSAGE_DEFLATE: bool = os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() == "true"  # costs CPU per connection; read by python -m app.main and app.worker, not the uvicorn CLI
+    WS_REPLAY_BUFFER_SIZE: int = int(os.getenv("WS_REPLAY_BUFFER_SIZE", "1024"))  # recent events kept for clients resuming with last_seq
+    WS_BACKPLANE_URL: str = os.getenv("WS_BACKPLANE_URL", "")  # e.g. unix:///tmp/kywash-bus.sock; empty = single process
     
     # Business Logic
     MACHINES_PER_TYPE: int = 6  # 6 washers + 6 dryers
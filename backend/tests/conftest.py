@@ -0,0 +1,45 @@
+"""
+Shared test fixtures
+
+The app reads its settings at import time, so the database and archive are
+pointed at a temporary directory before anything from the app is imported.
+All tests share that database; each test registers its own users and uses
+its own machines.
+"""
+import itertools
+import os
+import sys
+import tempfile
+
+_tmp_dir = tempfile.mkdtemp(prefix="kywash-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/kywash.db"
+os.environ["ACTIVITY_ARCHIVE_DIR"] = os.path.join(_tmp_dir, "archive")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+_student_ids = itertools.count(100000)
+
+@pytest.fixture
+def client():
+    """A client running the app's startup and shutdown around each test"""
+    with TestClient(app, base_url="http://localhost") as test_client:
+        yield test_client
+
+@pytest.fixture
+def register(client):
+    """Register a new user; returns (access token, user id, auth headers)"""
+    def register_user():
+        response = client.post("/api/v1/auth/register", json={
+            "student_id": str(next(_student_ids)),
+            "pin": "1234",
+            "phone_number": "0123456789",
+        })
+        assert response.status_code == 200, response.text
+        body = response.json()
+        token = body["access_token"]
+        return token, body["user"]["id"], {"Authorization": f"Bearer {token}"}
+    return register_user
@@ -0,0 +1,36 @@
+"""
+Activity feed: keyset pages follow time order when audit-critical (sync)
+and write-behind (buffered) activities are mixed
+"""
+from app.activity_log import activity_log
+
+def test_feed_pages_newest_first_across_sync_and_buffered(client, register):
+    _, user_id, headers = register()
+
+    # Buffered, buffered, then written in the request's own transaction
+    assert client.post("/api/v1/waitlist/join", json={"machine_type": "washer"}, headers=headers).status_code == 200
+    assert client.post("/api/v1/waitlist/leave", json={"machine_type": "washer"}, headers=headers).status_code == 200
+    response = client.post(
+        "/api/v1/faults/report",
+        json={"machine_id": 5, "machine_type": "washer", "description": "door will not latch"},
+        headers=headers
+    )
+    assert response.status_code == 200, response.text
+    client.portal.call(activity_log.flush)
+
+    feed = []
+    cursor = None
+    while True:
+        url = f"/api/v1/activities/user/{user_id}?limit=1"
+        if cursor:
+            url += f"&cursor={cursor}"
+        page = client.get(url, headers=headers).json()
+        feed += page["activities"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert [a["activity_type"] for a in feed] == ["fault_reported", "left_waitlist", "joined_waitlist"]
+    timestamps = [a["created_at"] for a in feed]
+    assert timestamps == sorted(timestamps, reverse=True)
+    assert len({a["id"] for a in feed}) == 3
@@ -0,0 +1,52 @@
+"""
+Cycle timer: a running machine whose ends_at has passed is completed
+"""
+from datetime import datetime, timedelta, timezone
+import time
+
+from sqlalchemy import select, update
+
+from app.cycle_timer import cycle_timer
+from app.database import AsyncSessionLocal
+from app.models import Machine, MachineType, Notification, NotificationType
+
+def machine_status(client, machine_type: str, machine_id: int) -> str:
+    machines = client.get("/api/v1/machines/").json()[f"{machine_type}s"]
+    return next(m for m in machines if m["machine_id"] == machine_id)["status"]
+
+def test_due_cycle_is_completed(client, register):
+    _, user_id, headers = register()
+    response = client.post(
+        "/api/v1/machines/start",
+        json={"machine_id": 6, "machine_type": "dryer", "category": "normal"},
+        headers=headers
+    )
+    assert response.status_code == 200, response.text
+    assert machine_status(client, "dryer", 6) == "in_use"
+
+    ends_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+
+    async def make_due():
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Machine)
+                .where(Machine.machine_type == MachineType.DRYER, Machine.machine_id == 6)
+                .values(ends_at=ends_at)
+            )
+            await db.commit()
+        cycle_timer.schedule(MachineType.DRYER, 6, ends_at)
+    client.portal.call(make_due)
+
+    deadline = time.monotonic() + 5
+    while machine_status(client, "dryer", 6) != "completed" and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert machine_status(client, "dryer", 6) == "completed"
+    assert cycle_timer.get_metrics()["unmatched"] == 0
+
+    async def notifications():
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Notification.notification_type).where(Notification.user_id == user_id)
+            )
+            return result.scalars().all()
+    assert NotificationType.CYCLE_COMPLETE in client.portal.call(notifications)
@@ -0,0 +1,68 @@
+"""
+WebSocket resume: replay within the send queue, snapshot beyond it, and
+resume requests on connections authenticated with ?token=
+"""
+from app.websocket_manager import manager
+from config import settings
+
+WS_URL = "ws://localhost/api/ws"
+
+def publish(client, count: int):
+    """Broadcast `count` events to every client; returns the last seq"""
+    async def broadcast():
+        for i in range(count):
+            await manager.broadcast({"event": "test_event", "data": {"i": i}})
+    client.portal.call(broadcast)
+    return manager.seq
+
+def connect_and_snapshot(client, url: str = WS_URL):
+    """Connect once and return the (seq, epoch) of the snapshot"""
+    with client.websocket_connect(url) as ws:
+        ws.send_json({})
+        snapshot = ws.receive_json()
+        assert snapshot["event"] == "snapshot"
+        return snapshot["seq"], snapshot["epoch"]
+
+def test_resume_replays_missed_events_in_order(client):
+    last_seq, epoch = connect_and_snapshot(client)
+    newest = publish(client, 10)
+
+    with client.websocket_connect(WS_URL) as ws:
+        ws.send_json({"action": "resume", "last_seq": last_seq, "epoch": epoch})
+        resumed = ws.receive_json()
+        assert resumed["event"] == "resumed"
+        assert resumed["replayed"] == 10
+        seqs = [ws.receive_json()["seq"] for _ in range(10)]
+
+    assert seqs == list(range(last_seq + 1, newest + 1))
+
+def test_resume_beyond_send_queue_falls_back_to_snapshot(client, monkeypatch):
+    monkeypatch.setattr(settings, "WS_SEND_QUEUE_SIZE", 16)
+    last_seq, epoch = connect_and_snapshot(client)
+    newest = publish(client, 40)
+
+    with client.websocket_connect(WS_URL) as ws:
+        ws.send_json({"action": "resume", "last_seq": last_seq, "epoch": epoch})
+        first = ws.receive_json()
+        assert first["event"] == "snapshot"
+        assert first["seq"] == newest
+
+        # Nothing stray follows: the next frame is the reply to this request
+        ws.send_json({"action": "subscribe", "topics": []})
+        assert ws.receive_json()["event"] == "subscribed"
+
+def test_resume_with_query_token_skips_snapshot(client, register):
+    token, _, _ = register()
+    url = f"{WS_URL}?token={token}"
+    last_seq, epoch = connect_and_snapshot(client, url)
+    newest = publish(client, 3)
+
+    with client.websocket_connect(url) as ws:
+        ws.send_json({"action": "resume", "last_seq": last_seq, "epoch": epoch})
+        assert ws.receive_json()["event"] == "resumed"
+        seqs = [ws.receive_json()["seq"] for _ in range(3)]
+
+        ws.send_json({"action": "subscribe", "topics": []})
+        assert ws.receive_json()["event"] == "subscribed"
+
+    assert seqs == list(range(last_seq + 1, newest + 1))
@@ -0,0 +1,68 @@
+"""
+Group commit: a unit that fails inside a batch is rolled back on its own
+savepoint without affecting the units committed with it
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app.database import AsyncSessionLocal
+from app.models import Notification, NotificationType, User
+from app.write_queue import group_writer, run_unit_of_work
+from config import settings
+
+@pytest.fixture
+def group_commit(monkeypatch):
+    monkeypatch.setattr(settings, "GROUP_COMMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "GROUP_COMMIT_WINDOW_MS", 50)
+
+def test_failing_unit_is_isolated_in_its_batch(group_commit, client, register):
+    _, user_id, _ = register()
+    assert group_writer.enabled
+
+    def notify(title: str):
+        async def unit(db):
+            db.add(Notification(
+                user_id=user_id,
+                notification_type=NotificationType.SYSTEM_ALERT,
+                title=title,
+                message=title
+            ))
+            await db.flush()
+            return title
+        return unit
+
+    async def duplicate_user(db):
+        db.add(Notification(
+            user_id=user_id,
+            notification_type=NotificationType.SYSTEM_ALERT,
+            title="rolled back",
+            message="rolled back"
+        ))
+        existing = await db.get(User, user_id)
+        db.add(User(student_id=existing.student_id, pin_hash="x", phone_number="0123456789"))
+        await db.flush()
+
+    async def run_batch():
+        batches = group_writer.batches
+        results = await asyncio.gather(
+            run_unit_of_work(notify("first")),
+            run_unit_of_work(duplicate_user),
+            run_unit_of_work(notify("third")),
+            return_exceptions=True
+        )
+        return results, group_writer.batches - batches
+
+    results, batches = client.portal.call(run_batch)
+    assert batches == 1
+    assert results[0] == "first"
+    assert isinstance(results[1], IntegrityError)
+    assert results[2] == "third"
+
+    async def titles():
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Notification.title).where(Notification.user_id == user_id))
+            return sorted(result.scalars().all())
+    assert client.portal.call(titles) == ["first", "third"]